@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import candidates
+import feedback
+import solver
+
+
+def _init_worker(cache_path):
+    # Each worker memory-maps the shared feedback matrix once
+    feedback.load_matrix(cache_path)
+
+
+def compute_move(history, strategy, bits=None):
+    # bits is the caller's candidate bitset, which saves rescanning the history
+    cands = None if bits is None else candidates.indices(bits)
+    return solver.recommend(history, strategy, cands=cands).guess
+
+
+class MovePool:
+    # Runs AI move searches in a bounded process pool so they never occupy
+    # the Socket.IO workers. When the pool is saturated or a move overruns
+    # its time budget, the cheap fallback strategy is computed inline.
+
+    def __init__(self, workers=None, max_pending=None, move_budget=0.5, strategy='minimax',
+                 fallback='first', cache_path='feedback_matrix.npy'):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.move_budget = move_budget
+        self.strategy = strategy
+        self.fallback = fallback
+        self.cache_path = cache_path
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.moves = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                    initargs=(self.cache_path,))
+            return self.executor
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+
+    def _record(self, start, fallback=False, timeout=False):
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.moves += 1
+            self.fallbacks += fallback
+            self.timeouts += timeout
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+
+    def choose_move(self, history, bits=None):
+        # Blocks the calling task for at most move_budget seconds
+        history = list(history)
+        start = time.perf_counter()
+        with self.lock:
+            saturated = self.pending >= self.max_pending
+            if not saturated:
+                self.pending += 1
+        if saturated:
+            guess = compute_move(history, self.fallback, bits)
+            self._record(start, fallback=True)
+            return guess
+        try:
+            future = self.get_executor().submit(compute_move, history, self.strategy, bits)
+        except Exception:
+            self._done(None)
+            raise
+        # pending drops when the worker finishes, even if we stopped waiting
+        future.add_done_callback(self._done)
+        try:
+            guess = future.result(timeout=self.move_budget)
+        except FutureTimeout:
+            future.cancel()
+            guess = compute_move(history, self.fallback, bits)
+            self._record(start, fallback=True, timeout=True)
+            return guess
+        self._record(start)
+        return guess
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.pending,
+                "max_pending": self.max_pending,
+                "moves": self.moves,
+                "fallbacks": self.fallbacks,
+                "timeouts": self.timeouts,
+                "latency_avg_ms": 1000 * self.latency_total / self.moves if self.moves else 0.0,
+                "latency_max_ms": 1000 * self.latency_max,
+            }
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -1,40 +1,239 @@
-from flask import Flask, request, render_template_string, jsonify
-from flask_socketio import SocketIO, emit
-import sqlite3
+from flask import Flask, Response, request, render_template_string, jsonify, abort
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import atexit
+import json
+import logging
+import os
 import random
+import time
+
+import candidates
+import feedback
+import metrics
+import profiling
+import ratelimit
+import spectate
+import stats
+import wire
+from ai import MovePool
+from archive import open_archive
+from assets import Asset, load_static
+from cluster import BusManager, Cluster, LocalBus, open_bus
+from dbpool import DBPool, Overloaded
+from eventlog import EventLog
+from lobby import Lobby
+from rules import STANDARD, from_request
+from store import MODES, RoomStore, VersionConflict
+from timers import TurnTimers
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app)
-
-# Initialize SQLite database
-def init_db():
-    conn = sqlite3.connect('game.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS games
-                 (room_id TEXT PRIMARY KEY, player1_secret TEXT, player2_secret TEXT,
-                  player1_guesses TEXT, player2_guesses TEXT, current_player INTEGER,
-                  game_over INTEGER, winner TEXT)''')
-    conn.commit()
-    conn.close()
-
-init_db()
-
-def evaluate_guess(secret, guess):
-    correct_positions = 0
-    correct_digits = 0
-    secret_digits = list(secret)
-    guess_digits = list(guess)
-    for i in range(4):
-        if secret_digits[i] == guess_digits[i]:
-            correct_positions += 1
-    secret_copy = secret_digits.copy()
-    guess_copy = guess_digits.copy()
-    for digit in set(guess_copy):
-        correct_digits += min(secret_copy.count(digit), guess_copy.count(digit))
-    return correct_digits, correct_positions
-
-# HTML template for the game (Web version)
+# Seconds between write-behind flushes of changed rooms to game.db
+app.config['STATE_FLUSH_INTERVAL'] = float(os.environ.get('STATE_FLUSH_INTERVAL', '1.0'))
+# Precomputed 5040x5040 feedback table, cached on disk and memory-mapped
+app.config['FEEDBACK_CACHE'] = os.environ.get('FEEDBACK_CACHE', 'feedback_matrix.npy')
+# AI opponent: process pool size, queue bound and per-move time budget (seconds)
+app.config['AI_WORKERS'] = int(os.environ.get('AI_WORKERS', os.cpu_count() or 1))
+app.config['AI_MAX_PENDING'] = int(os.environ.get('AI_MAX_PENDING', app.config['AI_WORKERS'] * 4))
+app.config['AI_MOVE_BUDGET'] = float(os.environ.get('AI_MOVE_BUDGET', '0.5'))
+app.config['AI_STRATEGY'] = os.environ.get('AI_STRATEGY', 'minimax')
+# Server-enforced turn length; on expiry the turn passes ('switch') or the game is lost ('forfeit')
+app.config['TURN_SECONDS'] = float(os.environ.get('TURN_SECONDS', '30'))
+app.config['TURN_TIMEOUT_ACTION'] = os.environ.get('TURN_TIMEOUT_ACTION', 'switch')
+# Browser/CDN cache lifetime for the game page; assets are fingerprinted and cached for a year
+app.config['PAGE_MAX_AGE'] = int(os.environ.get('PAGE_MAX_AGE', '3600'))
+# Multi-process mode: run WORKER_COUNT servers behind a sticky load balancer,
+# each with its own WORKER_ID, sharing MESSAGE_QUEUE (redis://...). local:// is
+# an in-process queue: it runs the same code path but cannot join processes.
+app.config['MESSAGE_QUEUE'] = os.environ.get('MESSAGE_QUEUE', '')
+app.config['WORKER_ID'] = int(os.environ.get('WORKER_ID', '0'))
+app.config['WORKER_COUNT'] = int(os.environ.get('WORKER_COUNT', '1'))
+# Matchmaking pairs players within the same region and skill range of this width
+app.config['MATCH_SKILL_BUCKET'] = int(os.environ.get('MATCH_SKILL_BUCKET', '200'))
+
+# Opt-in profiling: fraction of events run under cProfile, and the latency
+# above which an event is written to the slow-event log with its phases.
+# ADMIN_TOKEN enables the admin_profile event and /admin/profile.
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+app.config['SLOW_EVENT_MS'] = float(os.environ['SLOW_EVENT_MS']) if os.environ.get('SLOW_EVENT_MS') else None
+app.config['SLOW_EVENT_LOG'] = os.environ.get('SLOW_EVENT_LOG', '')
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN', '')
+# Rooms idle this long (seconds), or finished this long, are evicted by a
+# sweep every SWEEP_INTERVAL seconds. ARCHIVE_TARGET keeps a compact copy:
+# '' (none), 'table' (games_archive in game.db) or a file path.
+app.config['ROOM_IDLE_TTL'] = float(os.environ.get('ROOM_IDLE_TTL', '3600'))
+app.config['FINISHED_ROOM_TTL'] = float(os.environ.get('FINISHED_ROOM_TTL', '600'))
+app.config['SWEEP_INTERVAL'] = float(os.environ.get('SWEEP_INTERVAL', '60'))
+app.config['ARCHIVE_TARGET'] = os.environ.get('ARCHIVE_TARGET', '')
+app.config['VACUUM_PAGES'] = int(os.environ.get('VACUUM_PAGES', '1000'))
+# Track each player's remaining consistent codes and allow hint requests
+app.config['CANDIDATE_HINTS'] = os.environ.get('CANDIDATE_HINTS', '1') == '1'
+# Append-only log of every room transition, for replay.py; '' disables it
+app.config['EVENT_LOG_DIR'] = os.environ.get('EVENT_LOG_DIR', 'events')
+app.config['EVENT_SEGMENT_BYTES'] = int(os.environ.get('EVENT_SEGMENT_BYTES', str(64 << 20)))
+# Spectators get at most one snapshot per room every SPECTATOR_TICK seconds,
+# for up to SPECTATOR_MAX_ROOMS rooms per tick, written SPECTATOR_BATCH sockets at a time
+app.config['SPECTATOR_TICK'] = float(os.environ.get('SPECTATOR_TICK', '0.1'))
+app.config['SPECTATOR_MAX_ROOMS'] = int(os.environ.get('SPECTATOR_MAX_ROOMS', '1000'))
+app.config['SPECTATOR_BATCH'] = int(os.environ.get('SPECTATOR_BATCH', '500'))
+
+# Server concurrency model: 'eventlet', 'gevent' or 'threading' ('' picks the
+# first one installed). serve.py sets this and monkey-patches before import.
+app.config['ASYNC_MODE'] = os.environ.get('ASYNC_MODE', '')
+# Blocking SQLite calls run on DB_WORKERS OS threads; at most DB_MAX_PENDING
+# may queue, and a caller waits DB_QUEUE_TIMEOUT seconds for a slot
+app.config['DB_WORKERS'] = int(os.environ.get('DB_WORKERS', '4'))
+app.config['DB_MAX_PENDING'] = int(os.environ.get('DB_MAX_PENDING', '256'))
+app.config['DB_QUEUE_TIMEOUT'] = float(os.environ.get('DB_QUEUE_TIMEOUT', '5'))
+# Largest inbound Socket.IO message; game events are tiny
+app.config['MAX_MESSAGE_BYTES'] = int(os.environ.get('MAX_MESSAGE_BYTES', str(64 << 10)))
+
+# Token buckets for guess/set_secret/restart/hint: events a second and burst
+# size, per socket and per room (0 disables). The same event repeated by a
+# socket within DUPLICATE_WINDOW seconds is dropped, and a socket with
+# MAX_OUTBOUND_QUEUE packets waiting to be written is disconnected.
+app.config['SOCKET_EVENT_RATE'] = float(os.environ.get('SOCKET_EVENT_RATE', '5'))
+app.config['SOCKET_EVENT_BURST'] = float(os.environ.get('SOCKET_EVENT_BURST', '10'))
+app.config['ROOM_EVENT_RATE'] = float(os.environ.get('ROOM_EVENT_RATE', '20'))
+app.config['ROOM_EVENT_BURST'] = float(os.environ.get('ROOM_EVENT_BURST', '40'))
+app.config['DUPLICATE_WINDOW'] = float(os.environ.get('DUPLICATE_WINDOW', '1.0'))
+app.config['MAX_OUTBOUND_QUEUE'] = int(os.environ.get('MAX_OUTBOUND_QUEUE', '256'))
+
+candidates.configure(app.config['CANDIDATE_HINTS'])
+profiling.PROFILER.configure(app.config['PROFILE_SAMPLE_RATE'], app.config['SLOW_EVENT_MS'])
+if app.config['SLOW_EVENT_LOG']:
+    profiling.slow_log.addHandler(logging.FileHandler(app.config['SLOW_EVENT_LOG']))
+
+socketio_options = {'async_mode': app.config['ASYNC_MODE'] or None,
+                    'max_http_buffer_size': app.config['MAX_MESSAGE_BYTES']}
+bus = open_bus(app.config['MESSAGE_QUEUE'])
+if isinstance(bus, LocalBus):
+    socketio = SocketIO(app, client_manager=BusManager(bus), **socketio_options)
+elif bus is not None:
+    socketio = SocketIO(app, message_queue=app.config['MESSAGE_QUEUE'], **socketio_options)
+else:
+    socketio = SocketIO(app, **socketio_options)
+
+db_pool = DBPool(workers=app.config['DB_WORKERS'], max_pending=app.config['DB_MAX_PENDING'],
+                 queue_timeout=app.config['DB_QUEUE_TIMEOUT'], async_mode=socketio.async_mode)
+
+# Rooms are hashed to workers; only a room's owner changes its state
+cluster = Cluster(bus, app.config['WORKER_ID'], app.config['WORKER_COUNT'])
+
+# Live rooms are held in memory; SQLite is only written in batches
+store = RoomStore('game.db', flush_interval=app.config['STATE_FLUSH_INTERVAL'],
+                  idle_ttl=app.config['ROOM_IDLE_TTL'], finished_ttl=app.config['FINISHED_ROOM_TTL'],
+                  sweep_interval=app.config['SWEEP_INTERVAL'], archive=open_archive(app.config['ARCHIVE_TARGET']),
+                  vacuum_pages=app.config['VACUUM_PAGES'], db_pool=db_pool)
+store.init_db()
+store.load(owns=cluster.owns)
+store.start()
+atexit.register(store.close)
+feedback.warm(app.config['FEEDBACK_CACHE'])
+
+game_log = EventLog(app.config['EVENT_LOG_DIR'], worker_id=app.config['WORKER_ID'],
+                    segment_bytes=app.config['EVENT_SEGMENT_BYTES'],
+                    flush_interval=app.config['STATE_FLUSH_INTERVAL'])
+game_log.start()
+atexit.register(game_log.close)
+
+ai_pool = MovePool(workers=app.config['AI_WORKERS'], max_pending=app.config['AI_MAX_PENDING'],
+                   move_budget=app.config['AI_MOVE_BUDGET'], strategy=app.config['AI_STRATEGY'],
+                   cache_path=app.config['FEEDBACK_CACHE'])
+atexit.register(ai_pool.shutdown)
+
+# One heap and one loop hold every room's turn deadline
+turn_timers = TurnTimers(lambda room_id: handle_turn_timeout(room_id))
+for loaded in list(store.rooms.values()):
+    if not loaded.setup_phase and not loaded.game_over:
+        turn_timers.schedule(loaded.room_id, app.config['TURN_SECONDS'])
+turn_timers.start()
+atexit.register(turn_timers.stop)
+store.on_evict.append(turn_timers.cancel)
+
+# Matchmaking queue; with several workers it lives on the lobby owner only
+lobby = Lobby(skill_bucket_size=app.config['MATCH_SKILL_BUCKET'])
+
+# Socket sid -> room_id it joined, so leaves and disconnects can clean up,
+# and sid -> the game_state encoding it asked for. Spectator sids are read-only.
+socket_rooms = {}
+socket_formats = {}
+spectator_sids = set()
+# Socket sid -> (room_id, player) it joined as, held on the room's owner.
+# Moves are checked against this seat, not the player_id a client sends.
+# seat_holders is the inverse, so a seat has at most one sid.
+seats = {}
+seat_holders = {}
+
+# Inbound limits for player events, and the last one each socket sent
+socket_limiter = ratelimit.RateLimiter(app.config['SOCKET_EVENT_RATE'], app.config['SOCKET_EVENT_BURST'])
+room_limiter = ratelimit.RateLimiter(app.config['ROOM_EVENT_RATE'], app.config['ROOM_EVENT_BURST'])
+last_events = {}
+
+# Sockets that stop reading are dropped instead of buffered; the disconnect
+# runs as its own task, never inside the emit that noticed
+outbound = ratelimit.OutboundLimit(socketio.server, app.config['MAX_OUTBOUND_QUEUE'],
+                                   lambda sid: socketio.start_background_task(disconnect_slow_consumer, sid))
+
+# game_state encodings, built once per room version and format
+snapshots = wire.SnapshotCache()
+store.on_evict.append(snapshots.discard)
+
+# Coalesced snapshots for spectators of the rooms this worker owns
+spectators = spectate.Spectators(lambda room_id, formats: send_spectators(room_id, formats),
+                                 tick=app.config['SPECTATOR_TICK'], max_rooms=app.config['SPECTATOR_MAX_ROOMS'])
+spectators.start()
+atexit.register(spectators.stop)
+store.on_evict.append(spectators.discard)
+
+metrics.REGISTRY.gauge('mastermind_active_rooms', 'Rooms held in memory by this worker', lambda: len(store.rooms))
+metrics.REGISTRY.gauge('mastermind_ai_queue_depth', 'AI moves in flight in the process pool',
+                       lambda: ai_pool.stats()['queue_depth'])
+metrics.REGISTRY.gauge('mastermind_lobby_waiting', 'Players waiting for a match', lambda: lobby.stats()['waiting'])
+metrics.REGISTRY.gauge('mastermind_db_pool_pending', 'SQLite calls queued or running in the DB pool',
+                       lambda: db_pool.stats()['pending'])
+metrics.REGISTRY.gauge('mastermind_spectators', 'Spectators of rooms owned by this worker', spectators.count)
+
+def evaluate_guess(secret, guess, rules=STANDARD):
+    # Standard games use the feedback matrix once it is loaded; other rules,
+    # and the first moments after startup, use the packed-integer scorer.
+    if rules == STANDARD:
+        result = feedback.lookup(secret, guess)
+        if result is not None:
+            return result
+    return rules.score(secret, guess)
+
+# A transition that loses a version race is re-read and re-validated this many times
+TRANSITION_RETRIES = 3
+
+def run_transition(event, room_id, prepare):
+    # prepare(room) validates against the room as read and returns a function
+    # that applies the change, or None to drop the event. The change is then
+    # committed only if the room's version is still the one prepare saw;
+    # otherwise the room is read again, so a racing move is re-checked
+    # against the new turn rather than applied on top of it.
+    for _ in range(TRANSITION_RETRIES):
+        room = store.get(room_id)
+        if room is None:
+            return False
+        expected = room.version
+        apply = prepare(room)
+        if apply is None:
+            return False
+        try:
+            with store.transition(room, expected, event):
+                apply()
+            return True
+        except VersionConflict:
+            continue
+    return False
+
+def reject(sid, room, message):
+    # Only the sender hears about a move that is not theirs to make
+    send('rejected', {"room_id": room.room_id, "version": room.version, "message": message}, to=sid)
+
+# HTML template for the game (Web version). Styles and scripts live in
+# static/ and are linked under fingerprinted /assets/ URLs.
 GAME_PAGE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -44,233 +243,22 @@ GAME_PAGE = """
     <title>Mastermind - Two Players</title>
     <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@400;600&family=Lobster&display=swap" rel="stylesheet">
     <script src="https://cdn.jsdelivr.net/npm/canvas-confetti@1.5.1/dist/confetti.browser.min.js"></script>
-    <script src="https://unpkg.com/photon-realtime-js@4.1.4.7/dist/photon-realtime-js.js"></script>
     <script src="https://cdn.socket.io/4.5.0/socket.io.min.js"></script>
-    <style>
-        body {
-            font-family: 'Poppins', sans-serif;
-            background: linear-gradient(45deg, #00c4cc, #7fffd4, #00c4cc);
-            background-size: 400%;
-            animation: gradient 15s ease infinite;
-            margin: 0;
-            color: #fff;
-            position: relative;
-            overflow-x: hidden;
-        }
-        @keyframes gradient {
-            0% { background-position: 0% 50%; }
-            50% { background-position: 100% 50%; }
-            100% { background-position: 0% 50%; }
-        }
-        body::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            background: url('https://www.transparenttextures.com/patterns/stardust.png') repeat;
-            opacity: 0.2;
-            z-index: -1;
-            animation: parallax 50s linear infinite;
-        }
-        @keyframes parallax {
-            0% { background-position: 0 0; }
-            100% { background-position: 1000px 1000px; }
-        }
-        .container {
-            background-color: rgba(255, 255, 255, 0.95);
-            padding: 30px;
-            border-radius: 15px;
-            box-shadow: 0 10px 20px rgba(0, 0, 0, 0.3);
-            text-align: center;
-            width: 90%;
-            max-width: 600px;
-            margin: 20px auto;
-            animation: fadeIn 0.1s ease-in-out;
-            overflow-y: auto;
-        }
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(20px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        h1 {
-            font-family: 'Lobster', cursive;
-            font-size: 3em;
-            margin-bottom: 10px;
-            background: linear-gradient(45deg, #00c4cc, #7fffd4);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            animation: glow 3s ease-in-out infinite;
-        }
-        @keyframes glow {
-            0%, 100% { text-shadow: 0 0 10px #00c4cc, 0 0 20px #7fffd4; }
-            50% { text-shadow: 0 0 20px #00c4cc, 0 0 30px #7fffd4; }
-        }
-        p {
-            font-size: 1.2em;
-            color: #333;
-        }
-        input[type="text"] {
-            padding: 12px;
-            font-size: 1.1em;
-            width: 100%;
-            margin: 15px 0;
-            border: 2px solid #7fffd4;
-            border-radius: 8px;
-            outline: none;
-            transition: border-color 0.1s, box-shadow 0.1s;
-        }
-        input[type="text"]:focus {
-            border-color: #00c4cc;
-            box-shadow: 0 0 10px rgba(0, 196, 204, 0.5);
-        }
-        button {
-            padding: 12px 25px;
-            background: linear-gradient(45deg, #00c4cc, #7fffd4);
-            color: white;
-            border: none;
-            border-radius: 8px;
-            cursor: pointer;
-            font-size: 1.1em;
-            transition: transform 0.1s, box-shadow 0.1s, background 0.1s;
-            position: relative;
-            overflow: hidden;
-        }
-        button:hover {
-            transform: scale(1.05);
-            box-shadow: 0 0 15px rgba(0, 196, 204, 0.5);
-        }
-        button:active {
-            transform: scale(0.95);
-            background: linear-gradient(45deg, #7fffd4, #00c4cc);
-        }
-        button::after {
-            content: '';
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            width: 0;
-            height: 0;
-            background: rgba(255, 255, 255, 0.3);
-            border-radius: 50%;
-            transform: translate(-50%, -50%);
-            transition: width 0.3s, height 0.3s;
-        }
-        button:active::after {
-            width: 200px;
-            height: 200px;
-        }
-        .message {
-            margin: 20px 0;
-            font-weight: 600;
-            font-size: 1.3em;
-            color: #00c4cc;
-            animation: slideIn 0.1s ease-in-out;
-        }
-        @keyframes slideIn {
-            from { opacity: 0; transform: translateX(-20px); }
-            to { opacity: 1; transform: translateX(0); }
-        }
-        .winner-message {
-            font-size: 1.5em;
-            color: #fff;
-            background: linear-gradient(45deg, #00c4cc, #7fffd4);
-            padding: 15px;
-            border-radius: 10px;
-            margin: 20px 0;
-            animation: pulse 2s infinite;
-        }
-        @keyframes pulse {
-            0% { transform: scale(1); }
-            50% { transform: scale(1.05); }
-            100% { transform: scale(1); }
-        }
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            margin: 20px 0;
-            background-color: #fff;
-            border-radius: 8px;
-            overflow: hidden;
-        }
-        th, td {
-            border: 1px solid #ddd;
-            padding: 10px;
-            text-align: center;
-            color: #333;
-        }
-        th {
-            background: linear-gradient(45deg, #00c4cc, #7fffd4);
-            color: white;
-        }
-        tr {
-            animation: zoomIn 0.1s ease-in-out;
-        }
-        @keyframes zoomIn {
-            from { opacity: 0; transform: scale(0.9); }
-            to { opacity: 1; transform: scale(1); }
-        }
-        tr:hover {
-            background-color: rgba(0, 196, 204, 0.1);
-            transition: background-color 0.1s;
-        }
-        .player-turn {
-            font-size: 1.2em;
-            color: #7fffd4;
-            margin: 10px 0;
-            animation: slideIn 0.1s ease-in-out;
-        }
-        .restart {
-            background: linear-gradient(45deg, #ff4500, #ff8c00);
-            margin: 10px;
-        }
-        .restart:hover {
-            box-shadow: 0 0 15px rgba(255, 69, 0, 0.5);
-        }
-        .timer {
-            font-size: 1.2em;
-            color: #333;
-            margin: 10px 0;
-        }
-        .timer.warning {
-            color: #ff4500;
-            animation: shake 0.5s infinite;
-        }
-        @keyframes shake {
-            0% { transform: translateX(0); }
-            25% { transform: translateX(-5px); }
-            50% { transform: translateX(5px); }
-            75% { transform: translateX(-5px); }
-            100% { transform: translateX(0); }
-        }
-        .audio-control {
-            margin: 10px 0;
-        }
-        .audio-control button {
-            background: linear-gradient(45deg, #ff4500, #ff8c00);
-        }
-        .loading {
-            display: none;
-            font-size: 1em;
-            color: #00c4cc;
-            margin: 10px 0;
-        }
-        .loading::after {
-            content: '...';
-            animation: dots 1s steps(3, end) infinite;
-        }
-        @keyframes dots {
-            0% { content: '.'; }
-            33% { content: '..'; }
-            66% { content: '...'; }
-        }
-    </style>
+    <link rel="stylesheet" href="{{ css_url }}">
 </head>
 <body>
     <div class="container">
         <h1>Mastermind - Two Players</h1>
         <button class="restart" onclick="restartGame()">Restart Game</button>
+        <button onclick="playComputer()">Play vs Computer</button>
+        <input type="text" id="playerName" maxlength="32" placeholder="Your name" onchange="saveName()">
+        <select id="variant" onchange="findMatch()">
+            <option value="">Classic: 4 digits, no repeats</option>
+            <option value="5:0123456789:0">5 digits, no repeats</option>
+            <option value="4:012345:1">4 of 6 symbols, repeats</option>
+            <option value="6:0123456789AB:1">6 of 12 symbols, repeats</option>
+            <option value="8:0123456789ABCDEF:1">8 hex symbols, repeats</option>
+        </select>
         <div class="audio-control">
             <button onclick="toggleAudio()">Toggle Music</button>
         </div>
@@ -287,321 +275,645 @@ GAME_PAGE = """
             <div class="loading" id="loading">Loading...</div>
         </div>
     </div>
-    <script>
-        const socket = io();
-        let photonClient;
-        let roomId = null;
-        let playerId = null;
-        let timer = 30;
-        let timerInterval;
-        const timerElement = document.getElementById('timer');
-
-        // Initialize Photon
-        function initPhoton() {
-            photonClient = new Photon.LoadBalancing.LoadBalancingClient(Photon.ConnectionProtocol.Ws, 'YOUR_PHOTON_APP_ID', '1.0');
-            photonClient.onEvent = (code, content, actorNr) => {
-                if (code === 1) { // Custom event for game state update
-                    updateGameState(content);
-                }
-            };
-            photonClient.onJoinRoom = () => {
-                roomId = photonClient.myRoom().name;
-                playerId = photonClient.myActor().actorNr;
-                socket.emit('join_room', { room_id: roomId, player_id: playerId });
-            };
-            photonClient.connectToRegionMaster('EU');
-            photonClient.joinRandomRoom({}, 2); // Join a room with max 2 players
-        }
-
-        function startTimer() {
-            timer = 30;
-            timerElement.textContent = `Time Left: ${timer}s`;
-            timerElement.classList.remove('warning');
-            clearInterval(timerInterval);
-            timerInterval = setInterval(() => {
-                timer--;
-                timerElement.textContent = `Time Left: ${timer}s`;
-                if (timer <= 5) {
-                    timerElement.classList.add('warning');
-                }
-                if (timer <= 0) {
-                    clearInterval(timerInterval);
-                    alert("Time's up! Switching to the other player.");
-                    submitGuess(null);
-                }
-            }, 1000);
-        }
-
-        function toggleAudio() {
-            const audio = document.getElementById('backgroundMusic');
-            if (audio.paused) {
-                audio.play();
-            } else {
-                audio.pause();
-            }
-        }
-
-        async function setSecret(event) {
-            event.preventDefault();
-            const form = event.target;
-            const secret = form.querySelector('input[name="secret"]').value;
-            socket.emit('set_secret', { room_id: roomId, player_id: playerId, secret: secret });
-        }
-
-        async function submitGuess(event) {
-            if (event) event.preventDefault();
-            const form = document.getElementById('guessForm');
-            const guessInput = form.querySelector('input[name="guess"]');
-            const guess = guessInput.value;
-            socket.emit('guess', { room_id: roomId, player_id: playerId, guess: guess });
-        }
-
-        async function restartGame() {
-            socket.emit('restart', { room_id: roomId, player_id: playerId });
-        }
-
-        function updateGameState(data) {
-            const gameContent = document.getElementById('gameContent');
-            let html = '';
-            if (data.setup_phase) {
-                html = `
-                    <p id="message">${data.message}</p>
-                    <form id="setSecretForm" onsubmit="setSecret(event)">
-                        <input type="text" name="secret" maxlength="4" placeholder="Enter a 4-digit number" required>
-                        <button type="submit">Submit Secret Number</button>
-                    </form>
-                `;
-            } else {
-                html = `
-                    <p class="player-turn" id="playerTurn">Player ${data.current_player}'s Turn</p>
-                    <p>Guess your opponent's 4-digit number!</p>
-                    <p class="timer" id="timer">Time Left: ${data.timer}s</p>
-                    <p class="message" id="message">${data.message}</p>
-                    <div class="loading" id="loading">Loading...</div>
-                `;
-                if (data.game_over) {
-                    html += `<p class="winner-message" id="winnerMessage">${data.winner} Wins!</p>`;
-                    confetti({
-                        particleCount: 100,
-                        spread: 70,
-                        origin: { y: 0.6 }
-                    });
-                    document.getElementById('winSound').play();
-                }
-                html += `
-                    <h2>Player 1's Guesses</h2>
-                    <table id="player1Guesses">
-                        <tr>
-                            <th>Guess</th>
-                            <th>Correct Digits</th>
-                            <th>Correct Positions</th>
-                        </tr>
-                `;
-                data.player1_guesses.forEach(guess => {
-                    html += `
-                        <tr>
-                            <td>${guess[0]}</td>
-                            <td>${guess[1]}</td>
-                            <td>${guess[2]}</td>
-                        </tr>
-                    `;
-                });
-                html += `</table>`;
-                html += `
-                    <h2>Player 2's Guesses</h2>
-                    <table id="player2Guesses">
-                        <tr>
-                            <th>Guess</th>
-                            <th>Correct Digits</th>
-                            <th>Correct Positions</th>
-                        </tr>
-                `;
-                data.player2_guesses.forEach(guess => {
-                    html += `
-                        <tr>
-                            <td>${guess[0]}</td>
-                            <td>${guess[1]}</td>
-                            <td>${guess[2]}</td>
-                        </tr>
-                    `;
-                });
-                html += `</table>`;
-                if (!data.game_over) {
-                    html += `
-                        <form id="guessForm" onsubmit="submitGuess(event)">
-                            <input type="text" name="guess" maxlength="4" placeholder="Enter a 4-digit number" required>
-                            <button type="submit">Submit Guess</button>
-                        </form>
-                    `;
-                } else {
-                    html += `<button class="restart" onclick="restartGame()">Play Again</button>`;
-                }
-            }
-            gameContent.innerHTML = html;
-            if (!data.setup_phase && !data.game_over) {
-                startTimer();
-            }
-        }
-
-        socket.on('game_state', (data) => {
-            updateGameState(data);
-            if (photonClient && data.room_id === roomId) {
-                photonClient.raiseEvent(1, data); // Broadcast game state to other players
-            }
-        });
-
-        initPhoton();
-    </script>
-    <style>
-        .shake {
-            animation: shake 0.5s;
-        }
-    </style>
+    <script src="{{ js_url }}"></script>
 </body>
 </html>
 """
 
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Everything the page needs is rendered and compressed once at startup
+static_assets = {}
+asset_urls = {}
+for name, mimetype in (('game.css', 'text/css'), ('game.js', 'text/javascript')):
+    fingerprinted, asset = load_static(os.path.join(STATIC_DIR, name), mimetype)
+    static_assets[fingerprinted] = asset
+    asset_urls[name] = f"/assets/{fingerprinted}"
+
+with app.app_context():
+    game_page = Asset(render_template_string(GAME_PAGE, css_url=asset_urls['game.css'], js_url=asset_urls['game.js']),
+                      'text/html', f"public, max-age={app.config['PAGE_MAX_AGE']}")
+
 @app.route('/', methods=['GET'])
 def index():
-    return render_template_string(GAME_PAGE)
+    return game_page.response()
+
+@app.route('/assets/<name>', methods=['GET'])
+def static_asset(name):
+    asset = static_assets.get(name)
+    if asset is None:
+        abort(404)
+    return asset.response()
+
+@app.route('/ai/stats', methods=['GET'])
+def ai_stats():
+    return jsonify(ai_pool.stats())
+
+@app.route('/lobby/stats', methods=['GET'])
+def lobby_stats():
+    return jsonify(lobby.stats())
+
+@app.route('/db/stats', methods=['GET'])
+def db_stats():
+    return jsonify(db_pool.stats())
+
+@app.route('/leaderboard', methods=['GET'])
+def leaderboard():
+    # ?sort=wins|best_streak&limit=N&after=<next from the previous page>
+    sort = request.args.get('sort', 'wins')
+    if sort not in stats.SORTS:
+        abort(400)
+    try:
+        with metrics.track_db('leaderboard'):
+            page = store.run_db(query_stats, stats.leaderboard, sort, request.args.get('limit', 20, type=int),
+                                request.args.get('after'))
+    except ValueError:
+        abort(400)
+    except Overloaded:
+        abort(503)
+    return jsonify(page)
+
+@app.route('/players/<player_key>', methods=['GET'])
+def player_stats(player_key):
+    try:
+        with metrics.track_db('player_stats'):
+            player = store.run_db(query_stats, stats.player, player_key)
+    except Overloaded:
+        abort(503)
+    if player is None:
+        abort(404)
+    return jsonify(player)
+
+def query_stats(query, *args):
+    # Runs on a DB pool thread with a connection of its own
+    conn = store.connect()
+    try:
+        return query(conn, *args)
+    finally:
+        conn.close()
+
+def is_admin(token):
+    return bool(app.config['ADMIN_TOKEN']) and token == app.config['ADMIN_TOKEN']
+
+@app.route('/admin/profile', methods=['GET'])
+def admin_profile():
+    # Aggregated cProfile output per handler, optionally for one ?event=
+    if not is_admin(request.args.get('token')):
+        abort(403)
+    return Response(profiling.PROFILER.dump(request.args.get('event')), mimetype='text/plain')
+
+@socketio.on('admin_profile')
+@metrics.instrument('admin_profile')
+def handle_admin_profile(data):
+    # Toggle sampling or the slow-event threshold at runtime; reset clears collected stats
+    if not is_admin(data.get('token')):
+        return
+    if data.get('reset'):
+        profiling.PROFILER.reset()
+    settings = profiling.PROFILER.configure(data.get('sample_rate'), data.get('slow_ms'))
+    emit('admin_profile', settings)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@socketio.on('connect')
+@metrics.instrument('connect')
+def handle_connect(auth=None):
+    metrics.connected_sockets.inc()
+
+def route_event(event, data, sid):
+    # Run the room's state change here if this worker owns the room,
+    # otherwise hand it to the owner over the message queue
+    cluster.route(event, data, sid, run_room_event)
+
+def run_room_event(event, data, sid):
+    # Player events keep a room alive; timer and AI moves do not. Events for a
+    # room that has been evicted are dropped unless they (re)create it.
+    try:
+        room = store.get(data['room_id'])
+        if room is not None:
+            store.touch(room)
+        elif event not in ('create_room', 'join_room', 'watch', 'leave'):
+            return
+        ROOM_EVENTS[event](data, sid)
+    except Overloaded:
+        # The Socket.IO counterpart of the HTTP routes' 503; nothing was changed
+        send('busy', {"room_id": data['room_id'], "message": "The server is busy, please try again."}, to=sid)
+
+def route_player_event(event, data, sid):
+    # Front gate for player events, before any room or database work
+    reason = drop_reason(event, data, sid)
+    if reason is not None:
+        ratelimit.events_dropped.inc(event=event, reason=reason)
+        return
+    route_event(event, data, sid)
+
+def drop_reason(event, data, sid):
+    # Spectators are read-only. Then the socket's and the room's token buckets,
+    # then repeats (double clicks, client retries), then moves the in-memory
+    # room shows cannot apply. The room is only looked at on its owner, and
+    # only in memory: every unfinished room is held there, so an event for a
+    # room that is not cannot change anything and never costs a SELECT.
+    if sid in spectator_sids:
+        return 'spectator'
+    if not isinstance(data, dict) or 'room_id' not in data:
+        return 'malformed'
+    room_id = data['room_id']
+    if not socket_limiter.allow(sid):
+        return 'socket_rate'
+    if not room_limiter.allow(room_id):
+        return 'room_rate'
+    now = time.monotonic()
+    fingerprint = (event, room_id, data.get('player_id'), data.get('guess'), data.get('secret'))
+    last = last_events.get(sid)
+    last_events[sid] = (fingerprint, now)
+    if last is not None and last[0] == fingerprint and now - last[1] < app.config['DUPLICATE_WINDOW']:
+        return 'duplicate'
+    if event == 'restart' or not cluster.owns(room_id):
+        return None
+    room = store.rooms.get(room_id)
+    if room is None:
+        return 'unknown_room'
+    if event == 'guess' and (room.game_over or room.setup_phase or seat(sid, room_id) != room.current_player):
+        return 'out_of_turn'
+    if event == 'set_secret' and not room.setup_phase:
+        return 'out_of_turn'
+    return None
+
+def route_lobby_event(event, data, sid):
+    cluster.route_lobby(event, data, sid, run_lobby_event)
+
+def run_lobby_event(event, data, sid):
+    LOBBY_EVENTS[event](data, sid)
+
+@socketio.on('find_match')
+@metrics.instrument('find_match')
+def handle_find_match(data):
+    route_lobby_event('find_match', data or {}, request.sid)
+
+def find_match(data, sid):
+    # Players are only paired with others asking for the same rules
+    rules = from_request(data)
+    # Like bad rules, a region or skill that is not usable matches as unset
+    region = data.get('region') if isinstance(data.get('region'), str) else None
+    try:
+        skill = int(data['skill']) if data.get('skill') is not None else None
+    except (ValueError, TypeError, OverflowError):
+        skill = None
+    match = lobby.enqueue(sid, region, skill, rules.key)
+    if match is None:
+        send('match_waiting', {"message": "Waiting for another player to join..."}, to=sid)
+        return
+    room_id, first_sid, second_sid = match
+    # The room exists before either player joins it
+    route_event('create_room', {'room_id': room_id, 'rules': rules.key}, first_sid)
+    send('match_found', {"room_id": room_id, "player_id": 1}, to=first_sid)
+    send('match_found', {"room_id": room_id, "player_id": 2}, to=second_sid)
+
+@socketio.on('cancel_match')
+@metrics.instrument('cancel_match')
+def handle_cancel_match(data):
+    route_lobby_event('cancel_match', data or {}, request.sid)
+
+def cancel_match(data, sid):
+    lobby.cancel(sid)
+
+def create_game(data, sid):
+    store.get_or_create(data['room_id'], data.get('mode', 'pvp'), from_request(data))
 
 @socketio.on('join_room')
+@metrics.instrument('join_room')
 def handle_join_room(data):
+    room_id = data['room_id']
+    fmt = data.get('encoding') if data.get('encoding') in wire.FORMATS else 'json'
+    # Socket.IO room membership lives with the connection, on this worker.
+    # Deltas go to room_id; snapshots go to the room for the chosen encoding.
+    # Spectators join neither: they only get the coalesced spectator snapshots.
+    leave_game_rooms(request.sid)
+    socket_rooms[request.sid] = room_id
+    socket_formats[request.sid] = fmt
+    if data.get('role') == 'spectator':
+        join_room(wire.watch_room(room_id, fmt))
+        spectator_sids.add(request.sid)
+        route_event('watch', {'room_id': room_id, 'encoding': fmt}, request.sid)
+        return
+    join_room(room_id)
+    join_room(wire.format_room(room_id, fmt))
+    route_event('join_room', dict(data, encoding=fmt), request.sid)
+
+def leave_game_rooms(sid):
+    room_id = socket_rooms.pop(sid, None)
+    fmt = socket_formats.pop(sid, 'json')
+    if room_id is None:
+        return
+    if sid in spectator_sids:
+        spectator_sids.discard(sid)
+        leave_room(wire.watch_room(room_id, fmt))
+        # Watch counts live with the room, on its owner
+        route_event('unwatch', {'room_id': room_id, 'encoding': fmt}, sid)
+        return
+    leave_room(room_id)
+    leave_room(wire.format_room(room_id, fmt))
+    # Seats live with the room, on its owner
+    route_event('leave', {'room_id': room_id}, sid)
+
+def seat(sid, room_id):
+    # The player sid joined room_id as, or None
+    entry = seats.get(sid)
+    return entry[1] if entry is not None and entry[0] == room_id else None
+
+def join_game(data, sid):
     room_id = data['room_id']
     player_id = data['player_id']
-    conn = sqlite3.connect('game.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM games WHERE room_id = ?", (room_id,))
-    game = c.fetchone()
-    if not game:
-        c.execute("INSERT INTO games (room_id, player1_secret, player2_secret, player1_guesses, player2_guesses, current_player, game_over, winner) VALUES (?, NULL, NULL, ?, ?, 1, 0, NULL)",
-                  (room_id, str([]), str([])))
-        conn.commit()
-    conn.close()
-    emit_game_state(room_id)
+    mode = data.get('mode', 'pvp')
+    if mode not in MODES:
+        mode = 'pvp'
+    rules = from_request(data) if mode == 'pvp' else STANDARD
+    room = store.get_or_create(room_id, mode, rules)
+    with room.lock:
+        if player_id in (1, 2) and not (room.mode == 'vs_ai' and player_id == 2):
+            if take_seat(room, player_id, sid, data.get('player_key')):
+                store.set_player(room, player_id, data.get('player_key'), data.get('name'))
+            else:
+                release_seat(sid)
+                reject(sid, room, f"Player {player_id}'s seat is taken.")
+        else:
+            release_seat(sid)
+    # Full snapshot for the joiner; everyone else keeps applying deltas
+    emit_game_state(room_id, to=sid, fmt=data.get('encoding', 'json'))
+    if room.mode == 'vs_ai' and room.current_player == 2 and not room.setup_phase and not room.game_over:
+        # Resume a computer turn interrupted by a server restart
+        socketio.start_background_task(play_ai_move, room_id, room.version)
+
+def watch_game(data, sid):
+    room_id = data['room_id']
+    if store.get(room_id) is None:
+        send('room_not_found', {"room_id": room_id}, to=sid)
+        return
+    spectators.watch(room_id, data['encoding'])
+    # The first snapshot is sent straight away; later ones come with the ticks
+    emit_game_state(room_id, to=sid, fmt=data['encoding'])
+
+def unwatch_game(data, sid):
+    spectators.unwatch(data['room_id'], data['encoding'])
+
+def leave_game(data, sid):
+    if seat(sid, data['room_id']) is not None:
+        release_seat(sid)
+
+def take_seat(room, player, sid, key):
+    # Called under room.lock. A seat claimed by a player key only goes back to
+    # that key, e.g. a reconnecting player, whose old socket then loses it; an
+    # unclaimed seat goes to the first socket to sit in it. Returns whether
+    # sid now holds the seat.
+    holder = seat_holders.get((room.room_id, player))
+    claimed = room.player1_key if player == 1 else room.player2_key
+    if holder != sid and (stats.clean_key(key) != claimed if claimed is not None else holder is not None):
+        return False
+    if holder is not None and holder != sid:
+        seats.pop(holder, None)
+    release_seat(sid)
+    seats[sid] = (room.room_id, player)
+    seat_holders[(room.room_id, player)] = sid
+    return True
+
+def release_seat(sid):
+    entry = seats.pop(sid, None)
+    if entry is not None and seat_holders.get(entry) == sid:
+        del seat_holders[entry]
+
+@socketio.on('resync')
+@metrics.instrument('resync')
+def handle_resync(data):
+    # Sent by clients that see a gap in delta versions
+    route_event('resync', dict(data, encoding=socket_formats.get(request.sid, 'json')), request.sid)
+
+def resync_game(data, sid):
+    emit_game_state(data['room_id'], to=sid, fmt=data.get('encoding', 'json'))
+
+@socketio.on('leave_room')
+@metrics.instrument('leave_room')
+def handle_leave_room(data):
+    leave_game_rooms(request.sid)
+
+@socketio.on('disconnect')
+@metrics.instrument('disconnect')
+def handle_disconnect():
+    metrics.connected_sockets.dec()
+    route_lobby_event('cancel_match', {}, request.sid)
+    leave_game_rooms(request.sid)
+    socket_limiter.discard(request.sid)
+    last_events.pop(request.sid, None)
+    outbound.closed(request.sid)
+
+def disconnect_slow_consumer(sid):
+    socketio.server.disconnect(sid, namespace='/')
+    outbound.closed(sid)
 
 @socketio.on('set_secret')
+@metrics.instrument('set_secret')
 def handle_set_secret(data):
+    route_player_event('set_secret', data, request.sid)
+
+def set_secret(data, sid):
     room_id = data['room_id']
-    player_id = data['player_id']
+    player_id = seat(sid, room_id)
     secret = data['secret']
-    if not secret.isdigit() or len(secret) != 4 or len(set(secret)) != 4:
-        update_game_state(room_id, message="Invalid number! Please enter a 4-digit number with no repeating digits.")
-        return
-    conn = sqlite3.connect('game.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM games WHERE room_id = ?", (room_id,))
-    game = c.fetchone()
-    if game[1] is None:  # player1_secret
-        c.execute("UPDATE games SET player1_secret = ? WHERE room_id = ?", (secret, room_id))
-        update_game_state(room_id, message="Player 2: Enter your secret 4-digit number (no repeating digits).")
+
+    def prepare(room):
+        if not room.setup_phase:
+            return None
+        # Player 1 sets theirs first; the computer picks its own
+        due = 1 if room.mode == 'vs_ai' or room.player1_secret is None else 2
+        if player_id != due:
+            reject(sid, room, f"Waiting for Player {due} to set their secret.")
+            return None
+        if not room.rules.valid(secret):
+            return lambda: update_game_state(room_id, message=f"Invalid number! Please enter {room.rules.describe()}.")
+        return lambda: apply_secret(room, secret)
+
+    run_transition('set_secret', room_id, prepare)
+
+def apply_secret(room, secret):
+    if room.mode == 'vs_ai':
+        # Computer rooms always use the standard rules the solver is built for
+        # The computer picks its secret as soon as the human has set theirs
+        room.player1_secret = secret
+        room.player2_secret = random.choice(feedback.CODES)
+        room.setup_phase = False
+        room.message = "Player 1: Guess the computer's number!"
+        store.mark_dirty(room)
+        game_log.secret(room, 1, room.player1_secret)
+        game_log.secret(room, 2, room.player2_secret)
+    elif room.player1_secret is None:
+        room.player1_secret = secret
+        room.message = f"Player 2: Enter your secret {room.rules.prompt()}."
+        store.mark_dirty(room)
+        game_log.secret(room, 1, secret)
     else:
-        c.execute("UPDATE games SET player2_secret = ?, setup_phase = 0, message = ? WHERE room_id = ?",
-                  (secret, "Player 1: Guess Player 2's number!", room_id))
-    conn.commit()
-    conn.close()
-    emit_game_state(room_id)
+        room.player2_secret = secret
+        room.setup_phase = False
+        room.message = "Player 1: Guess Player 2's number!"
+        store.mark_dirty(room)
+        game_log.secret(room, 2, secret)
+    if not room.setup_phase:
+        turn_timers.schedule(room.room_id, app.config['TURN_SECONDS'])
+    emit_game_state(room.room_id)
 
 @socketio.on('guess')
+@metrics.instrument('guess')
 def handle_guess(data):
+    route_player_event('guess', data, request.sid)
+
+def submit_guess(data, sid):
     room_id = data['room_id']
-    player_id = data['player_id']
+    player_id = seat(sid, room_id)
     guess = data['guess']
-    conn = sqlite3.connect('game.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM games WHERE room_id = ?", (room_id,))
-    game = c.fetchone()
-    if game[6]:  # game_over
-        conn.close()
+
+    def prepare(room):
+        if room.game_over or room.setup_phase:
+            return None
+        # In computer rooms player 2 only ever moves through play_ai_move
+        if player_id != room.current_player or (room.mode == 'vs_ai' and player_id == 2):
+            reject(sid, room, f"It is Player {room.current_player}'s turn.")
+            return None
+        if not room.rules.valid(guess):
+            return lambda: update_game_state(room_id, message=f"Invalid guess! Please enter {room.rules.describe()}.")
+        # Scored before the compare-and-set, outside the room's lock
+        secret = room.player2_secret if player_id == 1 else room.player1_secret
+        with profiling.phase('evaluate'):
+            result = evaluate_guess(secret, guess, room.rules)
+        return lambda: apply_guess(room, guess, result)
+
+    run_transition('guess', room_id, prepare)
+
+def apply_guess(room, guess, result):
+    # Runs inside a transition; result is evaluate_guess() for the current player
+    player = room.current_player
+    opponent = 2 if player == 1 else 1
+    secret = room.player2_secret if player == 1 else room.player1_secret
+    correct_digits, correct_positions = result
+    with profiling.phase('db_write'):
+        seq = store.add_guess(room, player, guess, correct_digits, correct_positions)
+    game_log.guess(room, player, guess, correct_digits, correct_positions)
+    emit_delta(room, 'guess_added', player=player, seq=seq, guess=guess,
+               correct_digits=correct_digits, correct_positions=correct_positions,
+               remaining_count=candidates.remaining(room, player))
+    if correct_positions == room.rules.length:
+        finish_game(room, player, f"Player {player} guessed the number {secret}!", solved=True)
+    else:
+        change_turn(room, opponent, f"Player {opponent}: Guess Player {player}'s number! Try a different number!")
+
+def change_turn(room, player, message):
+    room.current_player = player
+    room.message = message
+    with profiling.phase('db_write'):
+        store.mark_dirty(room)
+    turn_timers.schedule(room.room_id, app.config['TURN_SECONDS'])
+    emit_delta(room, 'turn_changed', current_player=player, message=message,
+               timer=round(app.config['TURN_SECONDS']))
+    if room.mode == 'vs_ai' and player == 2:
+        socketio.start_background_task(play_ai_move, room.room_id, room.version)
+
+def finish_game(room, winner, message, solved=False):
+    room.message = message
+    with profiling.phase('db_write'):
+        store.finish(room, winner, solved)
+    turn_timers.cancel(room.room_id)
+    emit_delta(room, 'game_over', winner=room.winner, message=message)
+
+def handle_turn_timeout(room_id):
+    # Called from the timer loop when a player lets the clock run out. Not
+    # retried. pop_expired() removed the deadline before this ran, so a turn
+    # that has a deadline again was started by a move committed since: that
+    # player is not the one who ran out of time.
+    room = store.get(room_id)
+    if room is None:
         return
-    if not guess.isdigit() or len(guess) != 4 or len(set(guess)) != 4:
-        update_game_state(room_id, message="Invalid guess! Please enter a 4-digit number with no repeating digits.")
-        conn.close()
+    try:
+        with store.transition(room, room.version, 'timeout'):
+            if room.game_over or room.setup_phase or turn_timers.remaining(room_id) is not None:
+                return
+            player = room.current_player
+            opponent = 2 if player == 1 else 1
+            if app.config['TURN_TIMEOUT_ACTION'] == 'forfeit':
+                # Logged first so a computer move started by change_turn is logged after it
+                game_log.forfeit(room, opponent)
+                finish_game(room, opponent, f"Player {player} ran out of time. Player {opponent} wins!")
+            else:
+                game_log.turn(room, opponent)
+                change_turn(room, opponent, f"Player {player} ran out of time! Player {opponent}: Your turn!")
+    except VersionConflict:
+        pass
+
+def play_ai_move(room_id, version):
+    # Runs off the handler path; the search itself happens in ai_pool's processes
+    room = store.get(room_id)
+    if room is None or room.version != version:
         return
-    player1_guesses = eval(game[3])
-    player2_guesses = eval(game[4])
-    current_player = game[5]
-    if current_player == 1:
-        secret = game[2]  # player2_secret
-        correct_digits, correct_positions = evaluate_guess(secret, guess)
-        player1_guesses.append((guess, correct_digits, correct_positions))
-        if correct_positions == 4:
-            c.execute("UPDATE games SET player1_guesses = ?, game_over = 1, winner = ?, message = ? WHERE room_id = ?",
-                      (str(player1_guesses), "Player 1", f"Player 1 guessed the number {secret}!", room_id))
-        else:
-            c.execute("UPDATE games SET player1_guesses = ?, current_player = 2, message = ? WHERE room_id = ?",
-                      (str(player1_guesses), "Player 2: Guess Player 1's number! Try a different number!", room_id))
-    else:
-        secret = game[1]  # player1_secret
-        correct_digits, correct_positions = evaluate_guess(secret, guess)
-        player2_guesses.append((guess, correct_digits, correct_positions))
-        if correct_positions == 4:
-            c.execute("UPDATE games SET player2_guesses = ?, game_over = 1, winner = ?, message = ? WHERE room_id = ?",
-                      (str(player2_guesses), "Player 2", f"Player 2 guessed the number {secret}!", room_id))
-        else:
-            c.execute("UPDATE games SET player2_guesses = ?, current_player = 1, message = ? WHERE room_id = ?",
-                      (str(player2_guesses), "Player 1: Guess Player 2's number! Try a different number!", room_id))
-    conn.commit()
-    conn.close()
-    emit_game_state(room_id)
+    guess = ai_pool.choose_move(room.player2_guesses, candidates.bitset(room, 2))
+    # Dropped if the room moved on (restart, reload, timeout) while we searched.
+    # Scored only then: after a restart the human's secret is gone.
+    try:
+        with store.transition(room, version, 'ai_move'):
+            if room.game_over or room.current_player != 2:
+                return
+            apply_guess(room, guess, evaluate_guess(room.player1_secret, guess, room.rules))
+    except VersionConflict:
+        pass
+
+@socketio.on('hint')
+@metrics.instrument('hint')
+def handle_hint(data):
+    route_player_event('hint', data, request.sid)
+
+def request_hint(data, sid):
+    room = store.get(data['room_id'])
+    player = seat(sid, data['room_id'])
+    if room is None or player is None or room.setup_phase or room.game_over:
+        return
+    bits = candidates.bitset(room, player)
+    if bits is None:
+        send('hint', {"room_id": room.room_id, "player": player, "guess": None,
+                      "message": "Hints are not available for this game."}, to=sid)
+        return
+    # Searched in the AI pool, like a computer move, off the handler path
+    socketio.start_background_task(send_hint, room, player, bits, sid)
+
+def send_hint(room, player, bits, sid):
+    guess = ai_pool.choose_move(room.guesses(player), bits)
+    send('hint', {"room_id": room.room_id, "player": player, "guess": guess,
+                  "remaining_count": bits.bit_count()}, to=sid)
 
 @socketio.on('restart')
+@metrics.instrument('restart')
 def handle_restart(data):
+    route_player_event('restart', data, request.sid)
+
+def restart_game(data, sid):
     room_id = data['room_id']
-    conn = sqlite3.connect('game.db')
-    c = conn.cursor()
-    c.execute("UPDATE games SET player1_secret = NULL, player2_secret = NULL, player1_guesses = ?, player2_guesses = ?, current_player = 1, game_over = 0, winner = NULL, message = ?, setup_phase = 1 WHERE room_id = ?",
-              (str([]), str([]), "Player 1: Enter your secret 4-digit number (no repeating digits).", room_id))
-    conn.commit()
-    conn.close()
-    emit_game_state(room_id)
+    player_id = seat(sid, room_id)
+
+    def prepare(room):
+        if player_id not in (1, 2) or (room.mode == 'vs_ai' and player_id == 2):
+            reject(sid, room, "Only the players can restart this game.")
+            return None
+        return lambda: apply_restart(room)
+
+    run_transition('restart', room_id, prepare)
+
+def apply_restart(room):
+    room.player1_secret = None
+    room.player2_secret = None
+    store.clear_guesses(room)
+    room.current_player = 1
+    room.game_over = False
+    room.winner = None
+    room.message = f"Player 1: Enter your secret {room.rules.prompt()}."
+    room.setup_phase = True
+    store.mark_dirty(room)
+    game_log.restart(room)
+    turn_timers.cancel(room.room_id)
+    emit_game_state(room.room_id)
+
+def turn_time_left(room_id):
+    remaining = turn_timers.remaining(room_id)
+    return round(remaining if remaining is not None else app.config['TURN_SECONDS'])
 
 def update_game_state(room_id, **kwargs):
-    conn = sqlite3.connect('game.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM games WHERE room_id = ?", (room_id,))
-    game = c.fetchone()
-    data = {
-        "room_id": room_id,
-        "player1_secret": game[1],
-        "player2_secret": game[2],
-        "player1_guesses": eval(game[3]),
-        "player2_guesses": eval(game[4]),
-        "current_player": game[5],
-        "game_over": bool(game[6]),
-        "winner": game[7],
-        "message": game[8] if len(game) > 8 else "Waiting for another player to join...",
-        "setup_phase": bool(game[9] if len(game) > 9 else 1),
-        "timer": 30
-    }
+    room = store.get(room_id)
     for key, value in kwargs.items():
-        data[key] = value
-        if key != "timer":
-            c.execute(f"UPDATE games SET {key} = ? WHERE room_id = ?", (value, room_id))
-    conn.commit()
-    conn.close()
-    socketio.emit('game_state', data)
-
-def emit_game_state(room_id):
-    conn = sqlite3.connect('game.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM games WHERE room_id = ?", (room_id,))
-    game = c.fetchone()
-    data = {
-        "room_id": room_id,
-        "player1_secret": game[1],
-        "player2_secret": game[2],
-        "player1_guesses": eval(game[3]),
-        "player2_guesses": eval(game[4]),
-        "current_player": game[5],
-        "game_over": bool(game[6]),
-        "winner": game[7],
-        "message": game[8] if len(game) > 8 else "Waiting for another player to join...",
-        "setup_phase": bool(game[9] if len(game) > 9 else 1),
-        "timer": 30
-    }
-    conn.close()
-    socketio.emit('game_state', data)
+        setattr(room, key, value)
+    store.mark_dirty(room)
+    emit_game_state(room_id)
+
+def emit_game_state(room_id, to=None, fmt='json'):
+    # A snapshot for one socket in its encoding, or for the whole room in every
+    # encoding. Payloads come from the per-version cache, so repeated snapshots
+    # of an unchanged room are not serialized again.
+    room = store.get(room_id)
+    timer = turn_time_left(room_id)
+    targets = [(to, fmt)] if to else [(wire.format_room(room_id, f), f) for f in wire.FORMATS]
+    for target, target_fmt in targets:
+        send_snapshot(room, target, target_fmt, timer)
+    if to is None:
+        spectators.mark(room_id)
+
+def emit_delta(room, event, **changes):
+    # Small versioned event; clients apply it on top of their last snapshot
+    changes['room_id'] = room.room_id
+    changes['version'] = room.version
+    send(event, changes, to=room.room_id)
+    spectators.mark(room.room_id)
+
+def send_spectators(room_id, formats):
+    # Runs on the spectator tick: one snapshot per watched encoding, however
+    # many transitions the room went through since the last tick
+    room = store.get(room_id)
+    if room is None:
+        return
+    timer = turn_time_left(room_id)
+    for fmt in formats:
+        send_snapshot(room, wire.watch_room(room_id, fmt), fmt, timer)
+
+def send_snapshot(room, target, fmt, timer):
+    # game_state for every socket in target. With one worker the packet is built
+    # from the per-version cache and written as is, encoded once however many
+    # sockets get it. Across workers the recipients may be connected anywhere,
+    # so it goes through the message queue like any other emit.
+    if cluster.worker_count > 1:
+        with profiling.phase('serialize'):
+            data, size = snapshots.payload(room, fmt, timer)
+        send('game_state', data, to=target, size=size)
+        return
+    with profiling.phase('serialize'):
+        if fmt == 'json':
+            text = snapshots.text(room, timer)
+            encoded, size = spectate.encode_text(socketio.server, 'game_state', text), len(text)
+        else:
+            data, size = snapshots.payload(room, fmt, timer)
+            encoded = spectate.encode(socketio.server, 'game_state', data)
+    with profiling.phase('emit'):
+        fanout = spectate.write(socketio.server, encoded, target,
+                                batch_size=app.config['SPECTATOR_BATCH'], pause=lambda: socketio.sleep(0))
+    metrics.record_emit('game_state', size, fanout)
+    outbound.check(socketio.server.manager.rooms.get('/', {}).get(target))
+
+def send(event, data, to, size=None):
+    # Every outbound game event goes through here so size and fan-out are recorded.
+    # Fan-out counts this worker's sockets in the target room (a sid is its own room).
+    recipients = socketio.server.manager.rooms.get('/', {}).get(to)
+    if size is None:
+        with profiling.phase('serialize'):
+            size = len(json.dumps(data, separators=(',', ':')))
+    metrics.record_emit(event, size, len(recipients) if recipients else 0)
+    with profiling.phase('emit'):
+        socketio.emit(event, data, to=to)
+    outbound.check(recipients)
+
+# Room state changes, run only on the room's owning worker
+ROOM_EVENTS = {
+    'create_room': create_game,
+    'join_room': join_game,
+    'resync': resync_game,
+    'set_secret': set_secret,
+    'guess': submit_guess,
+    'restart': restart_game,
+    'hint': request_hint,
+    'watch': watch_game,
+    'unwatch': unwatch_game,
+    'leave': leave_game,
+}
+LOBBY_EVENTS = {
+    'find_match': find_match,
+    'cancel_match': cancel_match,
+}
+cluster.start(lambda event, data, sid: run_room_event(event, data, sid) if event in ROOM_EVENTS
+              else run_lobby_event(event, data, sid))
 
 if __name__ == "__main__":
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    # serve.py is the entry point; it also monkey-patches for eventlet/gevent,
+    # which has to happen before this module is imported
+    import serve
+    serve.run(app, socketio)
@@ -0,0 +1,102 @@
+import struct
+
+from feedback import pack, unpack
+from rules import STANDARD, Rules
+
+# One guess: player, code packed by Rules.encode, packed feedback byte
+GUESS = struct.Struct('>BIB')
+# File records: room_id length, archived_at, winner (0 = none), mode (0 = pvp, 1 = vs_ai),
+# guess count, Rules.key length (0 = standard); the room_id and key follow
+FILE_HEADER = struct.Struct('>HdBBHB')
+MODE_CODES = {'pvp': 0, 'vs_ai': 1}
+
+
+def winner_code(winner):
+    return int(winner.split()[-1]) if winner else 0
+
+
+def rules_key(rules):
+    return '' if rules == STANDARD else rules.key
+
+
+def pack_guesses(room):
+    encode = room.rules.encode
+    return b''.join(GUESS.pack(player, encode(guess), pack(digits, positions))
+                    for player in (1, 2)
+                    for guess, digits, positions in room.guesses(player))
+
+
+def unpack_guesses(blob, rules=STANDARD):
+    # Yields (player, guess, correct_digits, correct_positions)
+    for player, code, packed in GUESS.iter_unpack(blob):
+        digits, positions = unpack(packed)
+        yield player, rules.decode(code), digits, positions
+
+
+class TableArchive:
+    # Cold storage inside game.db: one narrow row per evicted game
+
+    def init(self, conn):
+        conn.execute('''CREATE TABLE IF NOT EXISTS games_archive
+                        (room_id TEXT, archived_at REAL, winner INTEGER, mode TEXT, guesses BLOB, rules TEXT)''')
+        if 'rules' not in {row[1] for row in conn.execute("PRAGMA table_info(games_archive)")}:
+            conn.execute("ALTER TABLE games_archive ADD COLUMN rules TEXT")
+
+    def write(self, conn, rooms, archived_at):
+        conn.executemany("INSERT INTO games_archive (room_id, archived_at, winner, mode, guesses, rules) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         [(room.room_id, archived_at, winner_code(room.winner), room.mode, pack_guesses(room),
+                           rules_key(room.rules) or None)
+                          for room in rooms])
+
+
+class FileArchive:
+    # Cold storage outside the database: length-prefixed binary records appended to a file
+
+    def __init__(self, path):
+        self.path = path
+
+    def init(self, conn):
+        pass
+
+    def write(self, conn, rooms, archived_at):
+        records = []
+        for room in rooms:
+            room_id = room.room_id.encode('utf-8')
+            key = rules_key(room.rules).encode('utf-8')
+            guesses = pack_guesses(room)
+            records.append(FILE_HEADER.pack(len(room_id), archived_at, winner_code(room.winner),
+                                            MODE_CODES.get(room.mode, 0), len(guesses) // GUESS.size, len(key)))
+            records.append(room_id)
+            records.append(key)
+            records.append(guesses)
+        with open(self.path, 'ab') as f:
+            f.write(b''.join(records))
+
+
+def read_file_archive(path):
+    # Yields (room_id, archived_at, winner, mode, rules, guesses) from a FileArchive file
+    modes = {code: mode for mode, code in MODE_CODES.items()}
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        id_length, archived_at, winner, mode, count, key_length = FILE_HEADER.unpack_from(data, offset)
+        offset += FILE_HEADER.size
+        room_id = data[offset:offset + id_length].decode('utf-8')
+        offset += id_length
+        key = data[offset:offset + key_length].decode('utf-8')
+        offset += key_length
+        rules = Rules.parse(key) if key else STANDARD
+        blob = data[offset:offset + count * GUESS.size]
+        offset += count * GUESS.size
+        yield room_id, archived_at, winner, modes.get(mode, 'pvp'), rules, list(unpack_guesses(blob, rules))
+
+
+def open_archive(target):
+    # '' disables archiving, 'table' uses games_archive, anything else is a file path
+    if not target:
+        return None
+    if target == 'table':
+        return TableArchive()
+    return FileArchive(target)
@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+class Asset:
+    # A response body prepared once at startup: identity, gzip and brotli
+    # variants plus the validators used for conditional requests.
+    __slots__ = ('variants', 'etags', 'digest', 'mimetype', 'last_modified', 'cache_control')
+
+    def __init__(self, body, mimetype, cache_control, last_modified=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.last_modified = datetime.fromtimestamp(int(last_modified or time.time()), timezone.utc)
+        self.variants = {'identity': body, 'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body, quality=11)
+        # Strong validators differ per encoding, since the bytes differ
+        self.etags = {encoding: self.digest if encoding == 'identity' else f"{self.digest}-{encoding}"
+                      for encoding in self.variants}
+
+    def choose_encoding(self):
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted[encoding] > 0:
+                return encoding
+        return 'identity'
+
+    def response(self):
+        encoding = self.choose_encoding()
+        etag = self.etags[encoding]
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and self.last_modified <= since
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.last_modified = self.last_modified
+        response.headers['Cache-Control'] = self.cache_control
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+
+def load_static(path, mimetype, max_age=31536000):
+    # Fingerprinted files never change under a given URL, so they can be
+    # cached for a year and marked immutable
+    with open(path, 'rb') as f:
+        body = f.read()
+    asset = Asset(body, mimetype, f"public, max-age={max_age}, immutable", os.path.getmtime(path))
+    name, ext = os.path.splitext(os.path.basename(path))
+    return f"{name}.{asset.digest}{ext}", asset
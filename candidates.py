@@ -0,0 +1,81 @@
+import functools
+
+import numpy as np
+
+import feedback
+from feedback import CODES, CODE_INDEX, pack
+from rules import STANDARD
+
+# Each player's still-possible secrets are a bitset over feedback.CODES held
+# in a Python int (bit i is CODES[i]), about 630 bytes per player. A guess
+# narrows it with one AND against the mask for its (guess, feedback) pair.
+# Only standard rooms are tracked; larger code spaces do not fit a bitset.
+ALL = (1 << len(CODES)) - 1
+MASK_BYTES = (len(CODES) + 7) // 8
+
+enabled = True
+
+
+def configure(on):
+    global enabled
+    enabled = bool(on)
+
+
+@functools.lru_cache(maxsize=16384)
+def mask(guess_index, packed):
+    # Secrets that would give `packed` feedback to this guess; a matrix row compare
+    row = feedback.get_matrix()[guess_index] == packed
+    return int.from_bytes(np.packbits(row, bitorder='little').tobytes(), 'little')
+
+
+def from_history(history):
+    bits = ALL
+    for guess, correct_digits, correct_positions in history:
+        bits &= mask(CODE_INDEX[guess], pack(correct_digits, correct_positions))
+    return bits
+
+
+def tracked(room):
+    # Bitsets need the feedback matrix; until it is loaded nothing is tracked
+    return enabled and room.rules == STANDARD and feedback.loaded()
+
+
+def bitset(room, player):
+    # The player's bitset, built from their history on first use
+    if not tracked(room):
+        return None
+    if player == 1:
+        if room.player1_candidates is None:
+            room.player1_candidates = from_history(room.player1_guesses)
+        return room.player1_candidates
+    if room.player2_candidates is None:
+        room.player2_candidates = from_history(room.player2_guesses)
+    return room.player2_candidates
+
+
+def narrow(room, player, guess, correct_digits, correct_positions):
+    # Called after the guess is appended; untracked players are built lazily instead
+    bits = room.player1_candidates if player == 1 else room.player2_candidates
+    if bits is None:
+        return
+    bits &= mask(CODE_INDEX[guess], pack(correct_digits, correct_positions))
+    if player == 1:
+        room.player1_candidates = bits
+    else:
+        room.player2_candidates = bits
+
+
+def reset(room):
+    room.player1_candidates = None
+    room.player2_candidates = None
+
+
+def remaining(room, player):
+    bits = bitset(room, player)
+    return None if bits is None else bits.bit_count()
+
+
+def indices(bits):
+    # Code indices of the set bits, in the form solver.candidates returns
+    raw = np.frombuffer(bits.to_bytes(MASK_BYTES, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder='little')[:len(CODES)])
@@ -0,0 +1,157 @@
+import logging
+import pickle
+import queue
+import threading
+import zlib
+
+import socketio
+
+import metrics
+
+log = logging.getLogger('mastermind.cluster')
+
+
+class LocalBus:
+    # In-process stand-in for Redis pub/sub. Every listener on a channel
+    # receives every message published to it. Only listeners in this process
+    # are reached, so it can carry messages between Cluster instances in one
+    # process (as tests do) but never between worker processes.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def publish(self, channel, message):
+        with self.lock:
+            targets = list(self.subscribers.get(channel, ()))
+        for q in targets:
+            q.put(message)
+
+    def listen(self, channel):
+        # Subscribes immediately, so nothing published after this call is missed
+        q = queue.Queue()
+        with self.lock:
+            self.subscribers.setdefault(channel, []).append(q)
+
+        def messages():
+            while True:
+                yield q.get()
+        return messages()
+
+
+class RedisBus:
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.redis.publish(channel, pickle.dumps(message))
+
+    def listen(self, channel):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+
+        def messages():
+            for message in pubsub.listen():
+                if message['type'] == 'message':
+                    yield pickle.loads(message['data'])
+        return messages()
+
+
+LOCAL_BUS = LocalBus()
+
+
+def open_bus(url):
+    if not url:
+        return None
+    if url.startswith('local://'):
+        return LOCAL_BUS
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBus(url)
+    raise ValueError(f"Unsupported message queue URL: {url}")
+
+
+class BusManager(socketio.PubSubManager):
+    # Socket.IO client manager that relays emits over a LocalBus, so the
+    # message-queue code path can run in one process without an external
+    # service. Flask-SocketIO's test client refuses any message queue; tests
+    # drive Cluster instances on a LocalBus instead.
+    name = 'bus'
+
+    def __init__(self, bus, channel='flask-socketio', write_only=False, logger=None):
+        self.bus = bus
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        self.bus.publish(self.channel, data)
+
+    def _listen(self):
+        yield from self.bus.listen(self.channel)
+
+
+class Cluster:
+    # Each room is owned by exactly one worker, picked by hashing room_id.
+    # Only the owner mutates the room; other workers forward events to it.
+
+    def __init__(self, bus=None, worker_id=0, worker_count=1):
+        if worker_count > 1 and bus is None:
+            raise ValueError("A message queue is required when running more than one worker")
+        if not 0 <= worker_id < worker_count:
+            raise ValueError(f"WORKER_ID must be in [0, {worker_count})")
+        self.bus = bus
+        self.worker_id = worker_id
+        self.worker_count = worker_count
+        # The matchmaking lobby is a single queue, kept on one worker
+        self.lobby_owner = 0
+        self.forwarded = 0
+
+    def owner(self, room_id):
+        return zlib.crc32(str(room_id).encode('utf-8')) % self.worker_count
+
+    def owns(self, room_id):
+        return self.worker_count == 1 or self.owner(room_id) == self.worker_id
+
+    def owns_lobby(self):
+        return self.worker_id == self.lobby_owner
+
+    def channel(self, worker_id):
+        return f"mastermind-worker-{worker_id}"
+
+    def route(self, event, data, sid, handle):
+        # Runs handle(event, data, sid) here if this worker owns the room,
+        # otherwise hands the event to the owner over the message queue
+        if self.owns(data['room_id']):
+            handle(event, data, sid)
+        else:
+            self.forward(data['room_id'], event, data, sid)
+
+    def route_lobby(self, event, data, sid, handle):
+        if self.owns_lobby():
+            handle(event, data, sid)
+        else:
+            self.forward_to(self.lobby_owner, event, data, sid)
+
+    def forward(self, room_id, event, data, sid):
+        self.forward_to(self.owner(room_id), event, data, sid)
+
+    def forward_to(self, worker_id, event, data, sid):
+        self.forwarded += 1
+        self.bus.publish(self.channel(worker_id), {'event': event, 'data': data, 'sid': sid})
+
+    def start(self, handle):
+        # handle(event, data, sid) runs forwarded events on this worker
+        if self.worker_count == 1:
+            return None
+        messages = self.bus.listen(self.channel(self.worker_id))
+
+        def run():
+            for message in messages:
+                try:
+                    handle(message['event'], message['data'], message['sid'])
+                except Exception:
+                    # Counted like a failing local handler; the listener keeps running
+                    log.exception("forwarded %s event failed", message['event'])
+                    metrics.event_errors.inc(event=message['event'])
+        thread = threading.Thread(target=run, name='room-owner', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+db_pool_rejected = metrics.REGISTRY.counter('mastermind_db_pool_rejected_total',
+                                            'SQLite calls refused because the DB pool queue stayed full')
+
+
+class Overloaded(Exception):
+    # The DB pool had no free slot within its queue timeout
+    pass
+
+
+class DBPool:
+    # Runs blocking sqlite3 work on a few real OS threads. Under eventlet or
+    # gevent a handler waiting on the database then only parks its own green
+    # thread; a slow disk no longer stalls every other socket on the worker.
+    # At most max_pending calls are queued or running; further callers wait
+    # up to queue_timeout for a slot and then get Overloaded.
+
+    def __init__(self, workers=4, max_pending=64, queue_timeout=5.0, async_mode='threading'):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.async_mode = async_mode
+        # Green when threading is monkey-patched, so waiting for a slot yields
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.calls = 0
+        if async_mode == 'eventlet':
+            # tpool's size is read from EVENTLET_THREADPOOL_SIZE when it starts
+            from eventlet import tpool
+            self.execute = tpool.execute
+        elif async_mode == 'gevent':
+            from gevent.threadpool import ThreadPool
+            pool = ThreadPool(workers)
+            self.execute = lambda fn, *args, **kwargs: pool.apply(fn, args, kwargs)
+        else:
+            executor = ThreadPoolExecutor(workers, thread_name_prefix='db')
+            self.execute = lambda fn, *args, **kwargs: executor.submit(fn, *args, **kwargs).result()
+
+    def run(self, fn, *args, **kwargs):
+        # Calls fn(*args, **kwargs) on a pool thread and returns its result;
+        # exceptions it raises are re-raised here
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            db_pool_rejected.inc()
+            raise Overloaded(f"{self.max_pending} database calls already pending")
+        with self.lock:
+            self.pending += 1
+            self.calls += 1
+        try:
+            return self.execute(fn, *args, **kwargs)
+        finally:
+            with self.lock:
+                self.pending -= 1
+            self.slots.release()
+
+    def stats(self):
+        with self.lock:
+            return {"async_mode": self.async_mode, "workers": self.workers, "max_pending": self.max_pending,
+                    "pending": self.pending, "calls": self.calls}
@@ -0,0 +1,271 @@
+import glob
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+from feedback import pack, unpack
+from rules import STANDARD, Rules
+from store import MODES, Room
+
+# One fixed-width record per event: kind, player, packed feedback, code packed
+# by Rules.encode, room number within the segment, room version after the
+# event, unix time
+RECORD = struct.Struct('<BBBxIIII')
+NAME, SECRET, GUESS, TURN, FORFEIT, RESTART = range(6)
+KINDS = ('name', 'secret', 'guess', 'turn', 'forfeit', 'restart')
+SEGMENT_NAME = re.compile(r'events-(\d+)-(\d+)\.log$')
+
+# A NAME record gives a room its number for the rest of the segment: player
+# holds the mode index, code the byte length of the payload that follows,
+# padded to whole records. The payload is the room_id, then a NUL and the
+# Rules.key for non-standard rooms. Each segment declares its own rooms, so
+# any segment can be replayed on its own.
+
+
+def name_record(number, room_id, mode, rules, version, timestamp):
+    name = room_id.encode('utf-8')
+    if rules != STANDARD:
+        name += b'\0' + rules.key.encode('utf-8')
+    padding = -len(name) % RECORD.size
+    return (RECORD.pack(NAME, MODES.index(mode), 0, len(name), number, version, timestamp)
+            + name + b'\0' * padding)
+
+
+class EventLog:
+    # Append-only log of room transitions. append() only queues a tuple; the
+    # flusher encodes batches and writes them to the current segment file,
+    # starting a new one every segment_bytes. An empty directory disables it.
+
+    def __init__(self, directory='', worker_id=0, segment_bytes=64 << 20, flush_interval=1.0):
+        self.directory = directory
+        self.worker_id = worker_id
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.segment = None
+        self.segment_size = 0
+        self.seq = 0
+        self.names = {}
+        self.running = False
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.seq = max((int(m.group(2)) for m in map(SEGMENT_NAME.search, segment_paths(directory))
+                            if m and int(m.group(1)) == worker_id), default=0)
+
+    def append(self, room, kind, player=0, code=None, correct_digits=0, correct_positions=0):
+        if not self.directory:
+            return
+        event = (room.room_id, room.mode, room.rules, kind, player, 0 if code is None else room.rules.encode(code),
+                 pack(correct_digits, correct_positions), room.version, int(time.time()))
+        with self.lock:
+            self.pending.append(event)
+
+    def secret(self, room, player, secret):
+        self.append(room, SECRET, player, secret)
+
+    def guess(self, room, player, guess, correct_digits, correct_positions):
+        self.append(room, GUESS, player, guess, correct_digits, correct_positions)
+
+    def turn(self, room, player):
+        # A turn passed without a guess, e.g. on timeout
+        self.append(room, TURN, player)
+
+    def forfeit(self, room, winner):
+        self.append(room, FORFEIT, winner)
+
+    def restart(self, room):
+        self.append(room, RESTART)
+
+    def open_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+        self.seq += 1
+        path = os.path.join(self.directory, f"events-{self.worker_id:03d}-{self.seq:08d}.log")
+        self.segment = open(path, 'ab')
+        self.segment_size = 0
+        self.names = {}
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+            out = bytearray()
+            try:
+                for room_id, mode, rules, kind, player, code, packed, version, timestamp in batch:
+                    if self.segment is None or self.segment_size + len(out) >= self.segment_bytes:
+                        if out:
+                            self.write(out)
+                            out = bytearray()
+                        self.open_segment()
+                    number = self.names.get(room_id)
+                    if number is None:
+                        number = self.names[room_id] = len(self.names)
+                        out += name_record(number, room_id, mode, rules, version, timestamp)
+                    out += RECORD.pack(kind, player, packed, code, number, version, timestamp)
+                self.write(out)
+            except OSError:
+                # Retry the whole batch in a fresh segment; readers skip a torn tail
+                self.segment = None
+                with self.lock:
+                    self.pending = batch + self.pending
+                raise
+            return len(batch)
+
+    def write(self, out):
+        self.segment.write(out)
+        self.segment.flush()
+        self.segment_size += len(out)
+
+    def start(self):
+        if not self.directory:
+            return None
+        thread = threading.Thread(target=self.run_flusher, name='event-log-flusher', daemon=True)
+        thread.start()
+        return thread
+
+    def run_flusher(self, sleep=time.sleep):
+        self.running = True
+        while self.running:
+            sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def close(self):
+        self.running = False
+        if not self.directory:
+            return
+        self.flush()
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+
+def segment_paths(path):
+    # A directory's segments in worker, then write order; a file is used as is
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, 'events-*-*.log')))
+
+
+def read_segment(path):
+    # Yields (room_id, kind, player, code, packed_feedback, version, timestamp).
+    # NAME events carry the room's mode index as player and its Rules as code.
+    # The file is mapped, not read, so segments of any size stream in
+    # constant memory.
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < RECORD.size:
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    size = RECORD.size
+    end = len(data) - len(data) % size
+    records = RECORD.iter_unpack(memoryview(data)[:end])
+    names = []
+    offset = 0
+    for kind, player, packed, code, number, version, timestamp in records:
+        offset += size
+        if kind == NAME:
+            blocks = -(-code // size)
+            if offset + blocks * size > end:
+                return  # torn tail
+            room_id, _, rules = data[offset:offset + code].decode('utf-8').partition('\0')
+            names.append(room_id)
+            for _ in range(blocks):
+                next(records)
+            offset += blocks * size
+            yield room_id, NAME, player, Rules.parse(rules) if rules else STANDARD, packed, version, timestamp
+        else:
+            yield names[number], kind, player, code, packed, version, timestamp
+
+
+def read_events(path):
+    for segment in segment_paths(path):
+        yield from read_segment(segment)
+
+
+def for_room(events, room_id):
+    return (event for event in events if event[0] == room_id)
+
+
+def replay(events, rooms=None):
+    # Rebuilds Room objects from events. Messages are not logged, so rebuilt
+    # rooms keep the default message. Nor are the turn changes that follow a
+    # guess: a rebuilt room's version is that of its last logged event, which
+    # can trail the live room's. Consecutive events usually hit the same room,
+    # so the last room and its rules are kept in locals.
+    rooms = {} if rooms is None else rooms
+    feedback = [unpack(packed) for packed in range(256)]
+    last_id = room = decode = solved = None
+    for room_id, kind, player, code, packed, version, timestamp in events:
+        if room_id != last_id:
+            room = rooms.get(room_id)
+            last_id = room_id
+            if room is not None:
+                decode, solved = room.rules.decode, pack(room.rules.length, room.rules.length)
+        if kind == GUESS:
+            room.version = version
+            (room.player1_guesses if player == 1 else room.player2_guesses).append((decode(code), *feedback[packed]))
+            if packed == solved:
+                room.game_over = True
+                room.winner = f"Player {player}"
+            else:
+                room.current_player = 3 - player
+            continue
+        if kind == NAME:
+            if room is None:
+                room = rooms[room_id] = Room(room_id, MODES[player], code)
+                decode, solved = code.decode, pack(code.length, code.length)
+            continue
+        room.version = version
+        if kind == SECRET:
+            if player == 1:
+                room.player1_secret = decode(code)
+            else:
+                room.player2_secret = decode(code)
+            if room.player1_secret is not None and room.player2_secret is not None:
+                room.setup_phase = False
+                room.current_player = 1
+        elif kind == TURN:
+            room.current_player = player
+        elif kind == FORFEIT:
+            room.game_over = True
+            room.winner = f"Player {player}"
+        elif kind == RESTART:
+            room = rooms[room_id] = Room(room_id, room.mode, room.rules)
+            room.version = version
+    return rooms
+
+
+def summarize(events):
+    # Whole-log counts for offline analysis
+    counts = [0] * len(KINDS)
+    solved_by_room = {}
+    wins = solved_guesses = 0
+    guesses_in_game = {}
+    for room_id, kind, player, code, packed, version, timestamp in events:
+        counts[kind] += 1
+        if kind == GUESS:
+            n = guesses_in_game[room_id, player] = guesses_in_game.get((room_id, player), 0) + 1
+            if packed == solved_by_room[room_id]:
+                wins += 1
+                solved_guesses += n
+        elif kind == NAME:
+            solved_by_room.setdefault(room_id, pack(code.length, code.length))
+        elif kind == RESTART:
+            guesses_in_game.pop((room_id, 1), None)
+            guesses_in_game.pop((room_id, 2), None)
+    return {
+        "events": sum(counts),
+        "rooms": len(solved_by_room),
+        "by_kind": dict(zip(KINDS, counts)),
+        "games_solved": wins,
+        "avg_guesses_to_solve": solved_guesses / wins if wins else 0.0,
+    }
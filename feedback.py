@@ -0,0 +1,109 @@
+import itertools
+import os
+import threading
+
+import numpy as np
+
+# Every valid secret: 4 distinct digits, in lexicographic order
+CODES = [''.join(p) for p in itertools.permutations('0123456789', 4)]
+CODE_INDEX = {code: i for i, code in enumerate(CODES)}
+CODE_ARRAY = np.array([[int(d) for d in code] for code in CODES], dtype=np.uint8)
+
+# Feedback is packed into one byte: correct_digits in the high nibble,
+# correct_positions in the low nibble.
+SOLVED = (4 << 4) | 4
+
+_matrix = None
+_lock = threading.Lock()
+
+
+def pack(correct_digits, correct_positions):
+    return (correct_digits << 4) | correct_positions
+
+
+def unpack(packed):
+    # Works on a single byte or on a numpy array of them
+    return packed >> 4, packed & 0x0F
+
+
+def build_matrix(chunk=512):
+    # matrix[g, s] is the packed feedback for guess CODES[g] against secret CODES[s]
+    n = len(CODES)
+    masks = (np.left_shift(1, CODE_ARRAY.astype(np.uint16))).sum(axis=1).astype(np.uint16)
+    popcount = np.array([bin(i).count('1') for i in range(1 << 10)], dtype=np.uint8)
+    matrix = np.empty((n, n), dtype=np.uint8)
+    for start in range(0, n, chunk):
+        block = CODE_ARRAY[start:start + chunk]
+        positions = (block[:, None, :] == CODE_ARRAY[None, :, :]).sum(axis=2, dtype=np.uint8)
+        digits = popcount[masks[start:start + chunk, None] & masks[None, :]]
+        matrix[start:start + chunk] = (digits << 4) | positions
+    return matrix
+
+
+def load_matrix(path='feedback_matrix.npy'):
+    # Built once, then memory-mapped from the on-disk cache on later starts
+    global _matrix
+    with _lock:
+        if _matrix is not None:
+            return _matrix
+        try:
+            matrix = np.load(path, mmap_mode='r')
+            if matrix.shape != (len(CODES), len(CODES)) or matrix.dtype != np.uint8:
+                raise ValueError(f"unexpected feedback matrix in {path}")
+        except (OSError, ValueError):
+            matrix = build_matrix()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, matrix)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+        _matrix = matrix
+        return _matrix
+
+
+def warm(path='feedback_matrix.npy'):
+    thread = threading.Thread(target=load_matrix, args=(path,), name='feedback-matrix', daemon=True)
+    thread.start()
+    return thread
+
+
+def loaded():
+    return _matrix is not None
+
+
+def get_matrix():
+    return _matrix if _matrix is not None else load_matrix()
+
+
+def lookup(secret, guess):
+    # Returns (correct_digits, correct_positions), or None when the table is
+    # not loaded yet or either code is outside the 4-distinct-digit space.
+    if _matrix is None:
+        return None
+    g = CODE_INDEX.get(guess)
+    s = CODE_INDEX.get(secret)
+    if g is None or s is None:
+        return None
+    digits, positions = unpack(int(_matrix[g, s]))
+    return digits, positions
+
+
+def to_indices(codes):
+    # Accepts a code string, a code index, or a sequence of either
+    if isinstance(codes, str):
+        return CODE_INDEX[codes]
+    if isinstance(codes, (int, np.integer)):
+        return int(codes)
+    if isinstance(codes, np.ndarray) and codes.dtype.kind in 'iu':
+        return codes
+    return np.array([CODE_INDEX[c] if isinstance(c, str) else int(c) for c in codes], dtype=np.intp)
+
+
+def score_batch(guesses, secrets):
+    # Scores one guess against many secrets, many guesses against one secret,
+    # or equal-length sequences pairwise. Returns (correct_digits, correct_positions)
+    # as uint8 arrays.
+    packed = get_matrix()[to_indices(guesses), to_indices(secrets)]
+    return unpack(np.asarray(packed))
@@ -0,0 +1,241 @@
+"""Drive the real app with simulated clients and report throughput and latency.
+
+    python loadtest.py                              # 1000 games, 2000 player sockets
+    python loadtest.py --games 200 --spectators 5 --rounds 3
+    python loadtest.py --output results.json        # machine-readable results
+    python loadtest.py --baseline results.json      # exit 1 on a regression
+
+Every client is a Flask-SocketIO test client, so handlers, the room store,
+write-behind flushes and the event log all run in-process with no network.
+Each game joins two players, sets both secrets, alternates guesses until
+player 1 wins, then restarts, for --rounds rounds. Games advance one step
+at a time in turn, so every client stays connected for the whole run.
+
+The game.db and event log go to a scratch directory (--workdir), never the
+working tree. Latency is the time a client's emit takes, which covers the
+handler and the delivery of everything it emits.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Result fields compared against --baseline: name -> True when higher is better
+CHECKS = {
+    'events_per_sec': True,
+    'latency_ms.p95': False,
+    'latency_ms.p99': False,
+    'emits_per_event': False,
+    'db_ops_per_event': False,
+}
+
+
+def percentiles(samples):
+    # samples in seconds; returns milliseconds
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {"count": len(ordered), "mean": sum(ordered) / len(ordered) * 1000,
+            "p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": ordered[-1] * 1000}
+
+
+def game_script(room_id, players, spectators, codes, rng, turns, rounds):
+    # Yields (client, event, data) steps for one room
+    p1, p2 = players
+    yield p1, 'join_room', {'room_id': room_id, 'player_id': 1}
+    yield p2, 'join_room', {'room_id': room_id, 'player_id': 2}
+    for watcher in spectators:
+        yield watcher, 'join_room', {'room_id': room_id, 'role': 'spectator', 'encoding': 'binary'}
+    for _ in range(rounds):
+        secret1, secret2 = rng.sample(codes, 2)
+        yield p1, 'set_secret', {'room_id': room_id, 'player_id': 1, 'secret': secret1}
+        yield p2, 'set_secret', {'room_id': room_id, 'player_id': 2, 'secret': secret2}
+        for _ in range(turns):
+            yield p1, 'guess', {'room_id': room_id, 'player_id': 1, 'guess': miss(rng, codes, secret2)}
+            yield p2, 'guess', {'room_id': room_id, 'player_id': 2, 'guess': miss(rng, codes, secret1)}
+        yield p1, 'guess', {'room_id': room_id, 'player_id': 1, 'guess': secret2}
+        yield p1, 'restart', {'room_id': room_id, 'player_id': 1}
+
+
+def miss(rng, codes, secret):
+    while True:
+        code = rng.choice(codes)
+        if code != secret:
+            return code
+
+
+def counter_total(counter, by=None):
+    # Sum of a counter, or a dict of sums keyed by one label
+    totals = {}
+    for key, value in counter.totals().items():
+        label = dict(key).get(by) if by else None
+        totals[label] = totals.get(label, 0) + value
+    return totals if by else totals.get(None, 0)
+
+
+def histogram_counts(histogram, by):
+    totals = {}
+    for key, entry in histogram.totals().items():
+        label = dict(key).get(by)
+        totals[label] = totals.get(label, 0) + entry[-1]
+    return totals
+
+
+def diff(after, before):
+    return {key: value - before.get(key, 0) for key, value in after.items() if value - before.get(key, 0)}
+
+
+def lookup(results, path):
+    value = results
+    for part in path.split('.'):
+        value = value[part]
+    return value
+
+
+def compare(results, baseline, tolerance):
+    # Regressions beyond tolerance (a fraction) as human-readable lines
+    failures = []
+    for path, higher_is_better in CHECKS.items():
+        try:
+            old, new = lookup(baseline, path), lookup(results, path)
+        except (KeyError, TypeError):
+            continue
+        if not old:
+            continue
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > tolerance:
+            failures.append(f"{path}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=1000, help="concurrent games (two player sockets each)")
+    parser.add_argument('--spectators', type=int, default=0, help="spectator sockets per game")
+    parser.add_argument('--turns', type=int, default=8, help="missed guesses per player before player 1 wins")
+    parser.add_argument('--rounds', type=int, default=1, help="games played per room, with a restart after each")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help="scratch directory for game.db and the event log (default: a new temp dir)")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="results JSON from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed regression against --baseline")
+    args = parser.parse_args(argv)
+
+    # Paths are resolved before moving into the scratch directory
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    os.environ.setdefault('FEEDBACK_CACHE', os.path.abspath('feedback_matrix.npy'))
+    os.environ.setdefault('AI_WORKERS', '1')
+    # The scripted clients are well-behaved but fast: keep the per-socket and
+    # per-room limiters in the path without letting them drop scripted moves
+    os.environ.setdefault('SOCKET_EVENT_RATE', '1000000')
+    os.environ.setdefault('ROOM_EVENT_RATE', '1000000')
+    os.environ.setdefault('DUPLICATE_WINDOW', '0')
+    workdir = args.workdir or tempfile.mkdtemp(prefix='mastermind-load-')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    import app as server
+    import feedback
+    import metrics
+    import ratelimit
+
+    # Scored through the matrix, as a warmed-up server would
+    feedback.load_matrix(server.app.config['FEEDBACK_CACHE'])
+    rng = random.Random(args.seed)
+    codes = list(feedback.CODES)
+
+    connect_start = time.perf_counter()
+    games = []
+    clients = []
+    for n in range(args.games):
+        players = [server.socketio.test_client(server.app) for _ in range(2)]
+        watchers = [server.socketio.test_client(server.app) for _ in range(args.spectators)]
+        clients.extend(players + watchers)
+        games.append(game_script(f"load-{args.seed}-{n}", players, watchers, codes, rng, args.turns, args.rounds))
+    connect_seconds = time.perf_counter() - connect_start
+    for client in clients:
+        client.get_received()
+
+    emits_before = counter_total(metrics.emits, 'event')
+    db_before = histogram_counts(metrics.db_time, 'op')
+    errors_before = counter_total(metrics.event_errors)
+    dropped_before = counter_total(ratelimit.events_dropped, 'reason')
+
+    latencies = {}
+    delivered = 0
+    start = time.perf_counter()
+    active = list(games)
+    while active:
+        still_active = []
+        for game in active:
+            step = next(game, None)
+            if step is None:
+                continue
+            client, event, data = step
+            began = time.perf_counter()
+            client.emit(event, data)
+            latencies.setdefault(event, []).append(time.perf_counter() - began)
+            still_active.append(game)
+        active = still_active
+        for client in clients:
+            delivered += len(client.get_received())
+    # Write-behind work still pending belongs to this run
+    server.store.flush()
+    elapsed = time.perf_counter() - start
+    # Spectator snapshots still queued for the next tick are not counted
+    server.spectators.stop()
+
+    emits = diff(counter_total(metrics.emits, 'event'), emits_before)
+    db_ops = diff(histogram_counts(metrics.db_time, 'op'), db_before)
+    events = sum(len(samples) for samples in latencies.values())
+    results = {
+        "config": {"games": args.games, "spectators": args.spectators, "turns": args.turns,
+                   "rounds": args.rounds, "seed": args.seed},
+        "clients": len(clients),
+        "connect_seconds": connect_seconds,
+        "events": events,
+        "elapsed_seconds": elapsed,
+        "events_per_sec": events / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles([s for samples in latencies.values() for s in samples]),
+        "latency_ms_by_event": {event: percentiles(samples) for event, samples in sorted(latencies.items())},
+        "emits": sum(emits.values()),
+        "emits_per_event": sum(emits.values()) / events if events else 0.0,
+        "emits_by_event": emits,
+        "deliveries_per_event": delivered / events if events else 0.0,
+        "db_ops": sum(db_ops.values()),
+        "db_ops_per_event": sum(db_ops.values()) / events if events else 0.0,
+        "db_ops_by_op": db_ops,
+        "handler_errors": counter_total(metrics.event_errors) - errors_before,
+        "events_dropped": diff(counter_total(ratelimit.events_dropped, 'reason'), dropped_before),
+        "workdir": workdir,
+    }
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    latency = results['latency_ms']
+    print(f"{events} events from {len(clients)} clients in {elapsed:.2f}s ({results['events_per_sec']:,.0f}/s), "
+          f"p50 {latency.get('p50', 0):.2f} ms, p95 {latency.get('p95', 0):.2f} ms, "
+          f"p99 {latency.get('p99', 0):.2f} ms", file=sys.stderr)
+
+    if baseline:
+        with open(baseline) as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        for line in failures:
+            print(f"regression: {line}", file=sys.stderr)
+        if failures or results['handler_errors']:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
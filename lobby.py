@@ -0,0 +1,74 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class Ticket:
+    __slots__ = ('sid', 'key', 'enqueued')
+
+    def __init__(self, sid, key):
+        self.sid = sid
+        self.key = key
+        self.enqueued = time.monotonic()
+
+
+class Lobby:
+    # Players waiting for an opponent, one FIFO per (region, skill bucket, rules).
+    # A new player is either paired with the oldest ticket in its bucket or
+    # queued behind it; both are constant-time, as is cancelling a ticket.
+
+    def __init__(self, skill_bucket_size=200):
+        self.skill_bucket_size = skill_bucket_size
+        self.queues = {}   # bucket key -> OrderedDict(sid -> Ticket)
+        self.tickets = {}  # sid -> Ticket
+        self.lock = threading.Lock()
+        self.matches = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def bucket(self, region=None, skill=None, variant=None):
+        skill_bucket = None if skill is None else int(skill) // self.skill_bucket_size
+        return (region, skill_bucket, variant)
+
+    def enqueue(self, sid, region=None, skill=None, variant=None):
+        # Returns (room_id, first_sid, second_sid) when a match forms, else None
+        key = self.bucket(region, skill, variant)
+        with self.lock:
+            if sid in self.tickets:
+                return None
+            waiting = self.queues.get(key)
+            if waiting:
+                opponent_sid, ticket = waiting.popitem(last=False)
+                del self.tickets[opponent_sid]
+                if not waiting:
+                    del self.queues[key]
+                wait = time.monotonic() - ticket.enqueued
+                self.matches += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                return f"match-{uuid.uuid4().hex[:12]}", opponent_sid, sid
+            ticket = self.tickets[sid] = Ticket(sid, key)
+            self.queues.setdefault(key, OrderedDict())[sid] = ticket
+            return None
+
+    def cancel(self, sid):
+        with self.lock:
+            ticket = self.tickets.pop(sid, None)
+            if ticket is None:
+                return False
+            waiting = self.queues[ticket.key]
+            del waiting[sid]
+            if not waiting:
+                del self.queues[ticket.key]
+            return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "waiting": len(self.tickets),
+                "buckets": len(self.queues),
+                "matches": self.matches,
+                "wait_avg_ms": 1000 * self.wait_total / self.matches if self.matches else 0.0,
+                "wait_max_ms": 1000 * self.wait_max,
+            }
@@ -0,0 +1,210 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+import profiling
+
+# Latency buckets in seconds, from 100us to 5s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+BYTES_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+FANOUT_BUCKETS = (0, 1, 2, 4, 8, 16, 64, 256, 1024, 4096)
+# Write shards per metric
+SHARDS = 16
+
+
+class Metric:
+    # Writes go to one of a fixed set of shards, picked by OS thread id, each
+    # with its own lock, so handler threads rarely wait on one another. The
+    # shard count never grows with the number of threads or greenlets that
+    # have written. Shards are summed only when /metrics is scraped.
+
+    def __init__(self, name, help, kind):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.shards = [{} for _ in range(SHARDS)]
+        self.locks = [threading.Lock() for _ in range(SHARDS)]
+
+    def shard(self):
+        # Green threads share their OS thread's shard; they never run in parallel
+        i = threading.get_native_id() % SHARDS
+        return self.shards[i], self.locks[i]
+
+    def merged(self):
+        # A copy of every shard, each taken under its lock
+        copies = []
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                copies.append({key: list(value) if isinstance(value, list) else value
+                               for key, value in shard.items()})
+        return copies
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{key}="{value}"' for key, value in labels)
+    return '{' + inner + '}'
+
+
+class Counter(Metric):
+    def __init__(self, name, help, kind='counter'):
+        super().__init__(name, help, kind)
+
+    def inc(self, amount=1, **labels):
+        shard, lock = self.shard()
+        key = tuple(sorted(labels.items()))
+        with lock:
+            shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def totals(self):
+        # label tuple -> value, summed over shards
+        totals = {}
+        for shard in self.merged():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        return [f"{self.name}{format_labels(key)} {value}" for key, value in sorted(self.totals().items())]
+
+
+class Gauge(Counter):
+    # inc/dec gauge, or a callback sampled at scrape time
+    def __init__(self, name, help, fn=None):
+        super().__init__(name, help, kind='gauge')
+        self.fn = fn
+
+    def render(self):
+        if self.fn is not None:
+            return [f"{self.name} {self.fn()}"]
+        return super().render()
+
+
+class Histogram(Metric):
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, 'histogram')
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard, lock = self.shard()
+        key = tuple(sorted(labels.items()))
+        with lock:
+            entry = shard.get(key)
+            if entry is None:
+                # per-bucket counts, then sum and count
+                entry = shard[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def totals(self):
+        # label tuple -> [per-bucket counts..., sum, count], summed over shards
+        totals = {}
+        for shard in self.merged():
+            for key, entry in shard.items():
+                total = totals.setdefault(key, [0] * len(entry))
+                for i, value in enumerate(entry):
+                    total[i] += value
+        return totals
+
+    def render(self):
+        lines = []
+        for key, entry in sorted(self.totals().items()):
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += entry[i]
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(key + (('le', '+Inf'),))} {entry[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {entry[-2]}")
+            lines.append(f"{self.name}_count{format_labels(key)} {entry[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help):
+        return self.register(Counter(name, help))
+
+    def gauge(self, name, help, fn=None):
+        return self.register(Gauge(name, help, fn))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+events = REGISTRY.counter('mastermind_events_total', 'Socket.IO events handled, by event')
+event_errors = REGISTRY.counter('mastermind_event_errors_total', 'Socket.IO handlers that raised, by event')
+event_latency = REGISTRY.histogram('mastermind_event_seconds', 'Socket.IO handler latency, by event')
+event_db_time = REGISTRY.histogram('mastermind_event_db_seconds', 'SQLite time spent inside a handler, by event')
+db_time = REGISTRY.histogram('mastermind_db_seconds', 'SQLite operation latency, by operation')
+emits = REGISTRY.counter('mastermind_emits_total', 'Outbound events, by event')
+emit_bytes = REGISTRY.histogram('mastermind_emit_bytes', 'Outbound payload size in bytes, by event', BYTES_BUCKETS)
+emit_fanout = REGISTRY.histogram('mastermind_emit_fanout', 'Local recipients per outbound event, by event',
+                                 FANOUT_BUCKETS)
+connected_sockets = REGISTRY.gauge('mastermind_connected_sockets', 'Sockets connected to this worker')
+
+_db_local = threading.local()
+
+
+@contextmanager
+def track_db(op, phase='db_read'):
+    # Adds the elapsed time to the current handler's DB total and phase breakdown
+    start = time.perf_counter()
+    try:
+        with profiling.phase(phase):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        db_time.observe(elapsed, op=op)
+        _db_local.seconds = getattr(_db_local, 'seconds', 0.0) + elapsed
+
+
+def instrument(event):
+    # Wraps a Socket.IO handler with count, latency and DB-time recording,
+    # and hands it to the profiler for sampling and slow-event logging
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            _db_local.seconds = 0.0
+            start = time.perf_counter()
+            try:
+                return profiling.PROFILER.call(event, handler, *args, **kwargs)
+            except Exception:
+                event_errors.inc(event=event)
+                raise
+            finally:
+                event_latency.observe(time.perf_counter() - start, event=event)
+                event_db_time.observe(_db_local.seconds, event=event)
+                events.inc(event=event)
+        return wrapper
+    return decorator
+
+
+def record_emit(event, size, fanout):
+    emits.inc(event=event)
+    emit_bytes.observe(size, event=event)
+    emit_fanout.observe(fanout, event=event)
@@ -0,0 +1,108 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+slow_log = logging.getLogger('mastermind.slow_events')
+
+_local = threading.local()
+
+
+@contextmanager
+def phase(name):
+    # Adds the block's time to the current event's phase breakdown, if any
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace[name] = trace.get(name, 0.0) + time.perf_counter() - start
+
+
+class Profiler:
+    # Runs a sampled fraction of handler calls under cProfile and keeps
+    # aggregated stats per event. Independently, any call slower than
+    # slow_ms is written to the slow-event log with its phase breakdown.
+
+    def __init__(self, sample_rate=0.0, slow_ms=None):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.stats = {}
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def configure(self, sample_rate=None, slow_ms=None):
+        # None leaves a setting unchanged; a negative slow_ms turns the slow log off
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if slow_ms is not None:
+            self.slow_ms = float(slow_ms) if float(slow_ms) >= 0 else None
+        return self.settings()
+
+    def settings(self):
+        return {"sample_rate": self.sample_rate, "slow_ms": self.slow_ms}
+
+    def call(self, event, fn, *args, **kwargs):
+        if not self.sample_rate and self.slow_ms is None:
+            return fn(*args, **kwargs)
+        _local.trace = {}
+        start = time.perf_counter()
+        try:
+            if self.sample_rate and random.random() < self.sample_rate:
+                return self._profiled(event, fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        finally:
+            elapsed_ms = 1000 * (time.perf_counter() - start)
+            trace, _local.trace = _local.trace, None
+            if self.slow_ms is not None and elapsed_ms >= self.slow_ms:
+                phases = {name: round(1000 * seconds, 3) for name, seconds in trace.items()}
+                phases['other'] = round(elapsed_ms - sum(phases.values()), 3)
+                slow_log.warning(json.dumps({"event": event, "ms": round(elapsed_ms, 3), "phases": phases}))
+
+    def _profiled(self, event, fn, *args, **kwargs):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self.lock:
+                if event in self.stats:
+                    self.stats[event].add(profile)
+                else:
+                    self.stats[event] = pstats.Stats(profile)
+                self.samples[event] = self.samples.get(event, 0) + 1
+
+    def dump(self, event=None, limit=25, sort='cumulative'):
+        # Aggregated profile text for one event, or for every sampled event
+        out = io.StringIO()
+        with self.lock:
+            events = [event] if event is not None else sorted(self.stats)
+            for name in events:
+                stats = self.stats.get(name)
+                if stats is None:
+                    continue
+                out.write(f"== {name} ({self.samples[name]} samples) ==\n")
+                stats.stream = out
+                stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.samples.clear()
+
+
+PROFILER = Profiler()
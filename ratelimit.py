@@ -0,0 +1,97 @@
+import threading
+import time
+
+import metrics
+
+events_dropped = metrics.REGISTRY.counter('mastermind_events_dropped_total',
+                                          'Inbound events dropped before reaching a room, by event and reason')
+slow_consumers = metrics.REGISTRY.counter('mastermind_slow_consumers_total',
+                                          'Sockets disconnected because their outbound queue was full')
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    # One token bucket per key (a socket sid or a room_id): `rate` tokens a
+    # second, holding at most `burst`. Buckets that have refilled completely
+    # behave like new ones, so they are pruned to keep idle keys from piling up.
+
+    def __init__(self, rate, burst, clock=time.monotonic, prune_every=4096):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.prune_every = prune_every
+        self.buckets = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def allow(self, key, cost=1):
+        if not self.rate:
+            return True
+        now = self.clock()
+        with self.lock:
+            self.calls += 1
+            if self.calls % self.prune_every == 0:
+                self.prune(now)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.burst, now)
+            else:
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+            if bucket.tokens < cost:
+                return False
+            bucket.tokens -= cost
+            return True
+
+    def prune(self, now):
+        # Called with the lock held
+        full = (self.burst / self.rate) if self.rate else 0
+        for key in [key for key, bucket in self.buckets.items() if now - bucket.updated >= full]:
+            del self.buckets[key]
+
+    def discard(self, key):
+        with self.lock:
+            self.buckets.pop(key, None)
+
+
+class OutboundLimit:
+    # Engine.IO queues each socket's packets until its transport writes them
+    # out, so a client that stops reading would be buffered without bound.
+    # check() finds recipients whose queue has reached max_queued and hands
+    # them to disconnect(sid) once, off the sending path.
+
+    def __init__(self, server, max_queued, disconnect):
+        self.server = server
+        self.max_queued = max_queued
+        self.disconnect = disconnect
+        self.closing = set()
+        self.lock = threading.Lock()
+
+    def queued(self, eio_sid):
+        socket = self.server.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
+
+    def check(self, recipients):
+        # recipients: {sid: eio_sid}, as held by the Socket.IO manager for a room
+        if not self.max_queued or not recipients:
+            return
+        slow = [sid for sid, eio_sid in list(recipients.items()) if self.queued(eio_sid) >= self.max_queued]
+        if not slow:
+            return
+        with self.lock:
+            slow = [sid for sid in slow if sid not in self.closing]
+            self.closing.update(slow)
+        for sid in slow:
+            slow_consumers.inc()
+            self.disconnect(sid)
+
+    def closed(self, sid):
+        with self.lock:
+            self.closing.discard(sid)
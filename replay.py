@@ -0,0 +1,49 @@
+"""Rebuild rooms or summarize games from event log segments.
+
+    python replay.py events/                 # summary of every segment
+    python replay.py events/ --room ROOM_ID  # rebuilt state of one room
+    python replay.py events/ --rooms         # rebuilt state of every room, one JSON line each
+
+Reads the log only; the games table is never touched.
+"""
+import argparse
+import json
+import sys
+import time
+
+import eventlog
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help="segment file or event log directory")
+    parser.add_argument('--room', help="rebuild a single room")
+    parser.add_argument('--rooms', action='store_true', help="rebuild every room")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    counter = [0]
+
+    def counted(events):
+        for event in events:
+            counter[0] += 1
+            yield event
+
+    events = counted(eventlog.read_events(args.path))
+    if args.room:
+        rooms = eventlog.replay(eventlog.for_room(events, args.room))
+        if args.room not in rooms:
+            parser.exit(1, f"room {args.room} not found\n")
+        print(json.dumps(rooms[args.room].to_state()))
+    elif args.rooms:
+        for room in eventlog.replay(events).values():
+            print(json.dumps(room.to_state()))
+    else:
+        print(json.dumps(eventlog.summarize(events), indent=2))
+    elapsed = time.perf_counter() - start
+    print(f"{counter[0]} events in {elapsed:.3f}s ({counter[0] / elapsed if elapsed else 0:,.0f}/s)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import functools
+
+HEX_DIGITS = '0123456789ABCDEF'
+MIN_LENGTH, MAX_LENGTH = 3, 8
+MAX_SYMBOLS = len(HEX_DIGITS)
+# Alphabets end up in room messages shown to both players; letters and digits only
+SYMBOL_CHARS = frozenset('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')
+
+# Per-symbol counts are packed into 5-bit fields: 4 bits of count (at most
+# MAX_LENGTH) under a guard bit, so a field-wise min is one subtraction.
+FIELD = 5
+ONES = sum(1 << (FIELD * i) for i in range(MAX_SYMBOLS))
+COUNT_BITS = ONES * 0x0F
+GUARDS = ONES << 4
+
+
+class Rules:
+    # A room's code rules: length, symbol alphabet and whether symbols may
+    # repeat. A code is packed into an int with one nibble per position
+    # holding the symbol's index in the alphabet, and into a second int of
+    # per-symbol counts. Scoring is then a handful of integer operations,
+    # whatever the length or alphabet.
+    __slots__ = ('length', 'alphabet', 'repeats', 'key', 'to_hex', 'from_hex', 'count_fields', 'symbols',
+                 'low_bits', 'hex_format')
+
+    def __init__(self, length=4, alphabet='0123456789', repeats=False):
+        if not MIN_LENGTH <= length <= MAX_LENGTH:
+            raise ValueError(f"Code length must be between {MIN_LENGTH} and {MAX_LENGTH}")
+        if (not 2 <= len(alphabet) <= MAX_SYMBOLS or len(set(alphabet)) != len(alphabet)
+                or not SYMBOL_CHARS.issuperset(alphabet)):
+            raise ValueError(f"Alphabet must be 2 to {MAX_SYMBOLS} distinct letters or digits")
+        if not repeats and length > len(alphabet):
+            raise ValueError("Code length exceeds the alphabet without repeats")
+        self.length = length
+        self.alphabet = alphabet
+        self.repeats = bool(repeats)
+        self.key = f"{length}:{alphabet}:{int(self.repeats)}"
+        self.to_hex = str.maketrans(alphabet, HEX_DIGITS[:len(alphabet)])
+        self.from_hex = str.maketrans(HEX_DIGITS[:len(alphabet)], alphabet)
+        self.hex_format = f"0{length}X"
+        self.count_fields = {symbol: 1 << (FIELD * i) for i, symbol in enumerate(alphabet)}
+        self.symbols = frozenset(alphabet)
+        # Bit 0 of every position nibble
+        self.low_bits = int('1' * length, 16)
+
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def parse(cls, key):
+        # Inverse of .key; rules are immutable, so parsed instances are shared
+        length, alphabet, repeats = key.split(':')
+        return cls(int(length), alphabet, repeats == '1')
+
+    def __eq__(self, other):
+        return isinstance(other, Rules) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Rules({self.length}, {self.alphabet!r}, repeats={self.repeats})"
+
+    def to_dict(self):
+        return {"length": self.length, "alphabet": self.alphabet, "repeats": self.repeats}
+
+    def describe(self):
+        # Used in prompts and error messages
+        if self == STANDARD:
+            return "a 4-digit number with no repeating digits"
+        kind = "number" if self.alphabet == HEX_DIGITS[:10] else f"code using {self.alphabet}"
+        repeats = "repeats allowed" if self.repeats else "no repeating symbols"
+        article = 'an' if self.length == 8 else 'a'
+        return f"{article} {self.length}-symbol {kind} with {repeats}"
+
+    def prompt(self):
+        # Completes "Enter your secret ..."
+        if self == STANDARD:
+            return "4-digit number (no repeating digits)"
+        repeats = ", repeats allowed" if self.repeats else ""
+        return f"{self.length}-symbol code (symbols {self.alphabet}{repeats})"
+
+    def valid(self, code):
+        return (isinstance(code, str) and len(code) == self.length and self.symbols.issuperset(code)
+                and (self.repeats or len(set(code)) == self.length))
+
+    def encode(self, code):
+        # One nibble per position, first symbol in the highest nibble
+        return int(code.translate(self.to_hex), 16)
+
+    def decode(self, packed):
+        return format(packed, self.hex_format).translate(self.from_hex)
+
+    def counts(self, code):
+        return sum(map(self.count_fields.__getitem__, code))
+
+    @functools.lru_cache(maxsize=4096)
+    def profile(self, code):
+        # Secrets are scored many times, so their packing is cached
+        return self.encode(code), self.counts(code)
+
+    def score(self, secret, guess):
+        # Returns (correct_digits, correct_positions) for two valid codes
+        secret_code, secret_counts = self.profile(secret)
+        guess_code, guess_counts = self.encode(guess), self.counts(guess)
+        # Positions: fold each nibble of the XOR into its low bit; set bits are misses
+        diff = secret_code ^ guess_code
+        diff |= diff >> 1
+        diff |= diff >> 2
+        correct_positions = self.length - (diff & self.low_bits).bit_count()
+        # Symbols: field-wise min of the two count vectors, then sum the fields
+        secret_ge = (((secret_counts | GUARDS) - guess_counts) & GUARDS) >> 4
+        take_guess = secret_ge * 0x0F
+        shared = (guess_counts & take_guess) | (secret_counts & (COUNT_BITS ^ take_guess))
+        correct_digits = ((shared * ONES) >> (FIELD * (MAX_SYMBOLS - 1))) & 0x1F
+        return correct_digits, correct_positions
+
+
+STANDARD = Rules()
+
+
+def from_request(data):
+    # Rules from a client payload: a 'rules' key, or length/alphabet/repeats
+    # fields. Anything missing or invalid falls back to the standard game.
+    try:
+        if data.get('rules'):
+            return Rules.parse(str(data['rules']))
+        if 'length' in data or 'alphabet' in data or 'repeats' in data:
+            return Rules.parse(f"{int(data.get('length', 4))}:{data.get('alphabet') or HEX_DIGITS[:10]}:"
+                               f"{int(bool(data.get('repeats')))}")
+    except (ValueError, TypeError):
+        pass
+    return STANDARD
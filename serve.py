@@ -0,0 +1,116 @@
+"""Production launcher for the game server.
+
+    python serve.py                      # HOST, PORT and the settings below from the environment
+    ASYNC_MODE=eventlet python serve.py
+
+ASYNC_MODE picks the concurrency model: 'gevent' or 'eventlet' serve every
+socket from green threads on one OS thread, so a worker holds many
+thousands of connections; 'threading' needs an OS thread per connection
+and is meant for development. Left empty, gevent is used if installed,
+then eventlet (which upstream now only maintains), then threading.
+MAX_CONNECTIONS caps concurrent connections and LISTEN_BACKLOG sizes the
+accept queue. SQLite work runs on the DB pool (DB_WORKERS, see app.py).
+"""
+import importlib.util
+import logging
+import os
+
+log = logging.getLogger('mastermind.serve')
+
+
+ASYNC_MODES = ('gevent', 'eventlet', 'threading')
+
+
+def installed(mode):
+    return mode == 'threading' or importlib.util.find_spec(mode) is not None
+
+
+def pick_async_mode(requested=''):
+    # A mode that was asked for must be usable; only the default falls back
+    if requested:
+        if requested not in ASYNC_MODES:
+            raise RuntimeError(f"ASYNC_MODE must be one of {', '.join(ASYNC_MODES)}, not {requested!r}")
+        if not installed(requested):
+            raise RuntimeError(f"ASYNC_MODE={requested} but {requested} is not installed "
+                               f"(pip install -r requirements.txt)")
+        return requested
+    for mode in ASYNC_MODES:
+        if installed(mode):
+            return mode
+
+
+def patch(mode):
+    # Must run before app (and anything that imports socket, threading or
+    # time) is imported, so that blocking calls yield to other sockets
+    if mode == 'eventlet':
+        # eventlet's OS thread pool, which DBPool runs SQLite calls on
+        os.environ.setdefault('EVENTLET_THREADPOOL_SIZE', os.environ.get('DB_WORKERS', '4'))
+        import eventlet
+        eventlet.monkey_patch()
+    elif mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def raise_fd_limit():
+    # Every socket is a file descriptor; the usual soft limit of 1024 is too low
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def run(app, socketio, host=None, port=None):
+    host = host or os.environ.get('HOST', '0.0.0.0')
+    port = port or int(os.environ.get('PORT', '5000'))
+    max_connections = int(os.environ.get('MAX_CONNECTIONS', '20000'))
+    backlog = int(os.environ.get('LISTEN_BACKLOG', '2048'))
+    mode = socketio.async_mode
+    log.info("serving on %s:%d with %s", host, port, mode)
+    if mode == 'eventlet':
+        import eventlet
+        import eventlet.wsgi
+        # eventlet.wsgi's default pool stops accepting at 1024 connections
+        listener = eventlet.listen((host, port), backlog=backlog)
+        eventlet.wsgi.server(listener, app, max_size=max_connections, log_output=False)
+    elif mode == 'gevent':
+        from gevent import pywsgi
+        from gevent.pool import Pool
+        options = {}
+        try:
+            from geventwebsocket.handler import WebSocketHandler
+            options['handler_class'] = WebSocketHandler
+            # It writes an access log line per request regardless of log=None
+            logging.getLogger('geventwebsocket.handler').setLevel(logging.WARNING)
+        except ImportError:
+            log.warning("gevent-websocket is not installed; clients will fall back to long polling")
+        server = pywsgi.WSGIServer((host, port), app, spawn=Pool(max_connections), backlog=backlog,
+                                   log=None, **options)
+        server.serve_forever()
+    else:
+        log.warning("threading mode uses one OS thread per connection; install eventlet for production")
+        socketio.run(app, host=host, port=port, debug=False, use_reloader=False, log_output=False,
+                     allow_unsafe_werkzeug=True)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    try:
+        mode = pick_async_mode(os.environ.get('ASYNC_MODE', ''))
+    except RuntimeError as exc:
+        raise SystemExit(f"serve.py: {exc}")
+    os.environ['ASYNC_MODE'] = mode
+    patch(mode)
+    raise_fd_limit()
+    from app import app, socketio
+    run(app, socketio)
+
+
+if __name__ == '__main__':
+    main()
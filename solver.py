@@ -0,0 +1,90 @@
+import random
+from collections import namedtuple
+
+import numpy as np
+
+from feedback import CODES, CODE_ARRAY, CODE_INDEX, SOLVED, get_matrix, pack
+
+STRATEGIES = ('minimax', 'entropy', 'first')
+
+# candidates: code indices (into feedback.CODES) still consistent with the history
+# guess: recommended next guess as a code string, or None if nothing is consistent
+Suggestion = namedtuple('Suggestion', ['candidates', 'guess'])
+
+# Packed feedback bytes are used directly as partition ids
+_BUCKETS = SOLVED + 1
+
+# Seeded from the OS on every call: AI pool workers are forked with the
+# parent's random state, so the random module would repeat across them
+_random = random.SystemRandom()
+
+
+def candidates(history, matrix=None):
+    # history holds (guess, correct_digits, correct_positions) tuples as stored by handle_guess
+    matrix = get_matrix() if matrix is None else matrix
+    mask = np.ones(len(CODES), dtype=bool)
+    for guess, correct_digits, correct_positions in history:
+        if guess not in CODE_INDEX:
+            raise ValueError(f"Not a valid code: {guess!r}")
+        mask &= matrix[CODE_INDEX[guess]] == pack(correct_digits, correct_positions)
+    return np.flatnonzero(mask)
+
+
+def partition_counts(guesses, cands, matrix=None, chunk=512):
+    # counts[i, b]: how many candidates guess i would put in feedback bucket b
+    matrix = get_matrix() if matrix is None else matrix
+    counts = np.empty((len(guesses), _BUCKETS), dtype=np.int64)
+    for start in range(0, len(guesses), chunk):
+        rows = guesses[start:start + chunk]
+        buckets = matrix[rows][:, cands] + (np.arange(len(rows)) * _BUCKETS)[:, None]
+        flat = np.bincount(buckets.ravel(), minlength=len(rows) * _BUCKETS)
+        counts[start:start + chunk] = flat.reshape(len(rows), _BUCKETS)
+    return counts
+
+
+def canonical_pool(history):
+    # Digits no guess has used yet are interchangeable: relabelling them gives
+    # the same partition of the candidates. Keep one guess per equivalence
+    # class, the one whose unused digits appear in ascending order.
+    used = {d for guess, _, _ in history for d in guess}
+    rank = np.full(10, -1, dtype=np.int8)
+    for i, d in enumerate(d for d in '0123456789' if d not in used):
+        rank[int(d)] = i
+    ranks = rank[CODE_ARRAY]
+    unused = ranks >= 0
+    expected = np.cumsum(unused, axis=1) - 1
+    return np.flatnonzero(np.all(~unused | (ranks == expected), axis=1))
+
+
+def _best(scores, pool, cands):
+    # Lowest score wins; ties go to guesses that could still be the secret,
+    # then to the lowest code index so results are deterministic.
+    in_set = np.isin(pool, cands)
+    order = np.lexsort((pool, ~in_set, scores))
+    return pool[order[0]]
+
+
+def recommend(history, strategy='minimax', pool=None, matrix=None, cands=None):
+    # cands, if given, are the code indices already known to fit the history
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; expected one of {STRATEGIES}")
+    matrix = get_matrix() if matrix is None else matrix
+    cands = candidates(history, matrix) if cands is None else cands
+    if len(cands) == 0:
+        return Suggestion(cands, None)
+    if len(cands) == len(CODES):
+        # Every opening is equivalent when all codes are still possible; a
+        # random one keeps the computer from always opening the same way
+        return Suggestion(cands, _random.choice(CODES))
+    if strategy == 'first' or len(cands) <= 2:
+        return Suggestion(cands, CODES[cands[0]])
+    pool = canonical_pool(history) if pool is None else np.asarray(pool, dtype=np.intp)
+    counts = partition_counts(pool, cands, matrix)
+    if strategy == 'minimax':
+        scores = counts.max(axis=1)
+    else:
+        p = counts / len(cands)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=1)
+        scores = -entropy
+    return Suggestion(cands, CODES[_best(scores, pool, cands)])
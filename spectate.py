@@ -0,0 +1,146 @@
+import json
+import logging
+import threading
+import time
+
+import metrics
+from socketio import packet
+
+spectator_updates = metrics.REGISTRY.counter('mastermind_spectator_updates_total',
+                                             'Room transitions for spectators, by result: queued for the '
+                                             'next tick, or coalesced into one already queued')
+log = logging.getLogger('mastermind.spectators')
+
+
+class Spectators:
+    # Watch counts and pending updates for the rooms this worker owns. A
+    # transition only marks its room pending; a loop sends each pending room
+    # one snapshot per encoding every tick. Spectator fan-out then costs at
+    # most one encode and one send per watched room and encoding per tick,
+    # however fast the players move.
+
+    def __init__(self, flush, tick=0.1, max_rooms=1000, clock=time.monotonic):
+        # flush(room_id, formats) sends one room's snapshot to its spectators
+        self.flush = flush
+        self.tick = tick
+        self.max_rooms = max_rooms
+        self.clock = clock
+        self.watchers = {}  # room_id -> {encoding: count}
+        self.pending = {}   # room_id -> None, oldest first
+        self.lock = threading.Lock()
+        self.running = False
+
+    def watch(self, room_id, fmt):
+        with self.lock:
+            counts = self.watchers.setdefault(room_id, {})
+            counts[fmt] = counts.get(fmt, 0) + 1
+
+    def unwatch(self, room_id, fmt):
+        with self.lock:
+            counts = self.watchers.get(room_id)
+            if counts is None or fmt not in counts:
+                return
+            counts[fmt] -= 1
+            if counts[fmt] <= 0:
+                del counts[fmt]
+            if not counts:
+                del self.watchers[room_id]
+                self.pending.pop(room_id, None)
+
+    def discard(self, room_id):
+        with self.lock:
+            self.watchers.pop(room_id, None)
+            self.pending.pop(room_id, None)
+
+    def count(self):
+        with self.lock:
+            return sum(sum(counts.values()) for counts in self.watchers.values())
+
+    def mark(self, room_id):
+        # Called on every transition; rooms nobody watches are ignored
+        with self.lock:
+            if room_id not in self.watchers:
+                return
+            if room_id in self.pending:
+                spectator_updates.inc(result='coalesced')
+                return
+            self.pending[room_id] = None
+        spectator_updates.inc(result='queued')
+
+    def take(self):
+        # Up to max_rooms pending rooms with their watched encodings; the rest
+        # stay queued, oldest first, for the next tick
+        with self.lock:
+            room_ids = []
+            for room_id in self.pending:
+                if len(room_ids) == self.max_rooms:
+                    break
+                room_ids.append(room_id)
+            batch = []
+            for room_id in room_ids:
+                del self.pending[room_id]
+                batch.append((room_id, tuple(self.watchers.get(room_id, ()))))
+        return batch
+
+    def run(self, sleep=time.sleep):
+        self.running = True
+        while self.running:
+            started = self.clock()
+            for room_id, formats in self.take():
+                try:
+                    self.flush(room_id, formats)
+                except Exception:
+                    # One bad room must not stop every other room's broadcast
+                    log.exception("spectator snapshot failed for room %s", room_id)
+                    metrics.event_errors.inc(event='spectator_tick')
+            sleep(max(0.0, self.tick - (self.clock() - started)))
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name='spectators', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.running = False
+
+
+class Encoded:
+    # A packet whose wire form is already known. Server._send_packet, like the
+    # Flask-SocketIO test client that replaces it, only calls encode().
+    __slots__ = ('encoded',)
+
+    def __init__(self, encoded):
+        self.encoded = encoded
+
+    def encode(self):
+        return self.encoded
+
+
+def encode(server, event, data):
+    return server.packet_class(packet.EVENT, namespace='/', data=[event, data]).encode()
+
+
+def encode_text(server, event, text):
+    # Same as encode() for a payload that is already JSON text, without
+    # parsing it again; other packet classes get the parsed payload
+    if server.packet_class is not packet.Packet:
+        return encode(server, event, json.loads(text))
+    return f'{packet.EVENT}[{json.dumps(event)},{text}]'
+
+
+def write(server, encoded, room, batch_size=500, pause=None):
+    # Writes one encoded packet to every local socket in a Socket.IO room,
+    # batch_size sockets at a time with pause() in between so other greenlets
+    # and threads get to run. Returns the number of sockets reached.
+    namespace = server.manager.rooms.get('/')
+    if not namespace or room not in namespace:
+        return 0
+    pkt = Encoded(encoded)
+    targets = [eio_sid for _, eio_sid in server.manager.get_participants('/', room)]
+    for start in range(0, len(targets), batch_size):
+        for eio_sid in targets[start:start + batch_size]:
+            server._send_packet(eio_sid, pkt)
+        if pause is not None and start + batch_size < len(targets):
+            pause()
+    return len(targets)
+
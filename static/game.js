@@ -0,0 +1,367 @@
+const socket = io();
+let roomId = null;
+let playerId = null;
+let timer = 30;
+let timerInterval;
+let state = null;  // last snapshot, patched in place by delta events
+// ?watch=<room_id> opens a read-only view of someone else's game
+const watchRoom = new URLSearchParams(window.location.search).get('watch');
+
+// Persistent identity for the leaderboard, kept in this browser
+const playerKey = localStorage.getItem('playerKey') || crypto.randomUUID();
+localStorage.setItem('playerKey', playerKey);
+
+function saveName() {
+    localStorage.setItem('playerName', document.getElementById('playerName').value);
+}
+
+function identity() {
+    // Also asks for the compact game_state encoding decoded below
+    return { player_key: playerKey, name: localStorage.getItem('playerName') || '', encoding: 'binary' };
+}
+
+// Binary game_state, see wire.py for the layout
+const utf8 = new TextDecoder();
+
+function decodeState(buffer) {
+    const view = new DataView(buffer);
+    let offset = 0;
+    const u8 = () => view.getUint8(offset++);
+    const u16 = () => { const v = view.getUint16(offset); offset += 2; return v; };
+    const u32 = () => { const v = view.getUint32(offset); offset += 4; return v; };
+    const text = (length) => {
+        const value = utf8.decode(new Uint8Array(buffer, offset, length));
+        offset += length;
+        return value;
+    };
+    u8();  // format version
+    const flags = u8();
+    const currentPlayer = u8();
+    const winner = u8();
+    const version = u32();
+    const remaining = [u32(), u32()].map(n => n === 0xFFFFFFFF ? null : n);
+    const roomId = text(u16());
+    const rulesKey = text(u8());
+    const message = text(u16());
+    const [length, alphabet, repeats] = rulesKey ? rulesKey.split(':') : ['4', '0123456789', '0'];
+    const rules = { length: Number(length), alphabet: alphabet, repeats: repeats === '1' };
+    const counts = [u16(), u16()];
+    const guesses = counts.map(count => {
+        const rows = [];
+        for (let i = 0; i < count; i++) {
+            const hex = u32().toString(16).padStart(rules.length, '0');
+            const code = Array.from(hex, d => rules.alphabet[parseInt(d, 16)]).join('');
+            const packed = u8();
+            rows.push([code, packed >> 4, packed & 0x0F]);
+        }
+        return rows;
+    });
+    return {
+        room_id: roomId,
+        player1_guesses: guesses[0],
+        player2_guesses: guesses[1],
+        current_player: currentPlayer,
+        game_over: Boolean(flags & 1),
+        winner: winner ? `Player ${winner}` : null,
+        message: message,
+        setup_phase: Boolean(flags & 2),
+        version: version,
+        mode: flags & 4 ? 'vs_ai' : 'pvp',
+        rules: rules,
+        remaining_count: remaining,
+        timer: u16(),
+    };
+}
+
+// Ask the server's matchmaking lobby for an opponent playing the selected rules
+function findMatch() {
+    const variant = document.getElementById('variant');
+    socket.emit('cancel_match', {});
+    socket.emit('find_match', { rules: variant ? variant.value : '' });
+}
+
+// Codes are case-sensitive; upper-case alphabets accept lower-case typing
+function normalizeCode(value) {
+    const alphabet = state && state.rules ? state.rules.alphabet : '';
+    return alphabet === alphabet.toUpperCase() ? value.toUpperCase() : value;
+}
+
+function codeHint(rules) {
+    if (!rules) return 'a 4-digit number';
+    return rules.alphabet === '0123456789' ? `a ${rules.length}-digit number` : `a ${rules.length}-symbol code`;
+}
+
+// Display only: the server owns the deadline and switches turns itself
+function startTimer(seconds) {
+    const timerElement = document.getElementById('timer');
+    timer = seconds;
+    timerElement.textContent = `Time Left: ${timer}s`;
+    timerElement.classList.remove('warning');
+    clearInterval(timerInterval);
+    timerInterval = setInterval(() => {
+        timer--;
+        timerElement.textContent = `Time Left: ${timer}s`;
+        if (timer <= 5) {
+            timerElement.classList.add('warning');
+        }
+        if (timer <= 0) {
+            clearInterval(timerInterval);
+            timerElement.textContent = "Time's up! Switching to the other player.";
+        }
+    }, 1000);
+}
+
+function toggleAudio() {
+    const audio = document.getElementById('backgroundMusic');
+    if (audio.paused) {
+        audio.play();
+    } else {
+        audio.pause();
+    }
+}
+
+async function setSecret(event) {
+    event.preventDefault();
+    const form = event.target;
+    const secret = normalizeCode(form.querySelector('input[name="secret"]').value);
+    socket.emit('set_secret', { room_id: roomId, player_id: playerId, secret: secret });
+}
+
+async function submitGuess(event) {
+    if (event) event.preventDefault();
+    const form = document.getElementById('guessForm');
+    const guessInput = form.querySelector('input[name="guess"]');
+    const guess = normalizeCode(guessInput.value);
+    socket.emit('guess', { room_id: roomId, player_id: playerId, guess: guess });
+}
+
+function playComputer() {
+    socket.emit('cancel_match', {});
+    // Server-hosted room where the computer plays Player 2
+    roomId = `ai-${Math.random().toString(36).slice(2, 10)}`;
+    playerId = 1;
+    socket.emit('join_room', { room_id: roomId, player_id: playerId, mode: 'vs_ai', ...identity() });
+}
+
+function requestHint() {
+    socket.emit('hint', { room_id: roomId, player_id: playerId });
+}
+
+function remainingLabel(count) {
+    return count === null || count === undefined ? '' : ` (${count} codes left)`;
+}
+
+async function restartGame() {
+    socket.emit('restart', { room_id: roomId, player_id: playerId });
+}
+
+// Server strings are interpolated into HTML below; escape them first
+function escapeHtml(value) {
+    return String(value).replace(/[&<>"']/g, c => `&#${c.charCodeAt(0)};`);
+}
+
+function updateGameState(data) {
+    state = data;
+    const gameContent = document.getElementById('gameContent');
+    const length = data.rules ? data.rules.length : 4;
+    const hint = codeHint(data.rules);
+    let html = '';
+    if (data.setup_phase && watchRoom) {
+        html = `<p id="message">Watching: the players are choosing their secrets.</p>`;
+    } else if (data.setup_phase) {
+        html = `
+            <p id="message">${escapeHtml(data.message)}</p>
+            <form id="setSecretForm" onsubmit="setSecret(event)">
+                <input type="text" name="secret" maxlength="${length}" placeholder="Enter ${hint}" required>
+                <button type="submit">Submit Secret Number</button>
+            </form>
+        `;
+    } else {
+        html = `
+            <p class="player-turn" id="playerTurn">Player ${data.current_player}'s Turn</p>
+            <p>Guess your opponent's ${hint.replace(/^an? /, '')}!</p>
+            <p class="timer" id="timer">Time Left: ${data.timer}s</p>
+            <p class="message" id="message">${escapeHtml(data.message)}</p>
+            <div class="loading" id="loading">Loading...</div>
+        `;
+        if (data.game_over) {
+            html += `<p class="winner-message" id="winnerMessage">${escapeHtml(data.winner)} Wins!</p>`;
+            confetti({
+                particleCount: 100,
+                spread: 70,
+                origin: { y: 0.6 }
+            });
+            document.getElementById('winSound').play();
+        }
+        html += `
+            <h2>Player 1's Guesses<span id="player1Remaining">${remainingLabel(data.remaining_count && data.remaining_count[0])}</span></h2>
+            <table id="player1Guesses">
+                <tr>
+                    <th>Guess</th>
+                    <th>Correct Digits</th>
+                    <th>Correct Positions</th>
+                </tr>
+        `;
+        data.player1_guesses.forEach(guess => {
+            html += `
+                <tr>
+                    <td>${escapeHtml(guess[0])}</td>
+                    <td>${escapeHtml(guess[1])}</td>
+                    <td>${escapeHtml(guess[2])}</td>
+                </tr>
+            `;
+        });
+        html += `</table>`;
+        html += `
+            <h2>Player 2's Guesses<span id="player2Remaining">${remainingLabel(data.remaining_count && data.remaining_count[1])}</span></h2>
+            <table id="player2Guesses">
+                <tr>
+                    <th>Guess</th>
+                    <th>Correct Digits</th>
+                    <th>Correct Positions</th>
+                </tr>
+        `;
+        data.player2_guesses.forEach(guess => {
+            html += `
+                <tr>
+                    <td>${escapeHtml(guess[0])}</td>
+                    <td>${escapeHtml(guess[1])}</td>
+                    <td>${escapeHtml(guess[2])}</td>
+                </tr>
+            `;
+        });
+        html += `</table>`;
+        if (watchRoom) {
+            // Spectators only get snapshots; nothing to submit
+        } else if (!data.game_over) {
+            html += `
+                <form id="guessForm" onsubmit="submitGuess(event)">
+                    <input type="text" name="guess" maxlength="${length}" placeholder="Enter ${hint}" required>
+                    <button type="submit">Submit Guess</button>
+                    <button type="button" onclick="requestHint()">Hint</button>
+                </form>
+            `;
+        } else {
+            html += `<button class="restart" onclick="restartGame()">Play Again</button>`;
+        }
+    }
+    gameContent.innerHTML = html;
+    if (!data.setup_phase && !data.game_over) {
+        startTimer(data.timer);
+    }
+}
+
+function appendGuessRow(player, guess) {
+    const table = document.getElementById(`player${player}Guesses`);
+    if (!table) return;
+    const row = table.insertRow(-1);
+    guess.forEach(value => {
+        row.insertCell(-1).textContent = value;
+    });
+}
+
+// Deltas must arrive in version order; on a gap ask for a fresh snapshot
+function applyDelta(data, patch) {
+    if (!state || data.room_id !== state.room_id || data.version <= state.version) return;
+    if (data.version !== state.version + 1) {
+        socket.emit('resync', { room_id: state.room_id });
+        return;
+    }
+    state.version = data.version;
+    patch(data);
+}
+
+socket.on('game_state', (data) => {
+    updateGameState(data instanceof ArrayBuffer ? decodeState(data) : data);
+});
+
+// Sent only to us when the server refuses a move, e.g. out of turn
+socket.on('rejected', (data) => {
+    if (!state || data.room_id !== state.room_id) return;
+    const message = document.getElementById('message');
+    if (message) message.textContent = data.message;
+});
+
+// The server's database queue was full; the event was not applied
+socket.on('busy', (data) => {
+    const message = document.getElementById('message');
+    if (message) message.textContent = data.message;
+});
+
+socket.on('room_not_found', (data) => {
+    const message = document.getElementById('message');
+    if (message) message.textContent = `There is no game called ${data.room_id} to watch.`;
+});
+
+socket.on('match_waiting', (data) => {
+    const message = document.getElementById('message');
+    if (message) message.textContent = data.message;
+});
+
+// The server paired us and allocated the room; join it as our assigned player
+socket.on('match_found', (data) => {
+    roomId = data.room_id;
+    playerId = data.player_id;
+    socket.emit('join_room', { room_id: roomId, player_id: playerId, ...identity() });
+});
+
+socket.on('guess_added', (data) => applyDelta(data, () => {
+    const guess = [data.guess, data.correct_digits, data.correct_positions];
+    state[`player${data.player}_guesses`].push(guess);
+    appendGuessRow(data.player, guess);
+    if (state.remaining_count) {
+        state.remaining_count[data.player - 1] = data.remaining_count;
+        const label = document.getElementById(`player${data.player}Remaining`);
+        if (label) label.textContent = remainingLabel(data.remaining_count);
+    }
+}));
+
+// Only sent to the player who asked; pre-fills the guess box
+socket.on('hint', (data) => {
+    if (!state || data.room_id !== state.room_id) return;
+    const message = document.getElementById('message');
+    if (data.guess === null) {
+        if (message) message.textContent = data.message;
+        return;
+    }
+    const guessInput = document.querySelector('#guessForm input[name="guess"]');
+    if (guessInput) guessInput.value = data.guess;
+    if (message) message.textContent = `Hint: try ${data.guess} (${data.remaining_count} codes still possible)`;
+});
+
+socket.on('turn_changed', (data) => applyDelta(data, () => {
+    state.current_player = data.current_player;
+    state.message = data.message;
+    document.getElementById('playerTurn').textContent = `Player ${data.current_player}'s Turn`;
+    document.getElementById('message').textContent = data.message;
+    const guessInput = document.querySelector('#guessForm input[name="guess"]');
+    if (guessInput) guessInput.value = '';
+    startTimer(data.timer);
+}));
+
+socket.on('game_over', (data) => applyDelta(data, () => {
+    state.game_over = true;
+    state.winner = data.winner;
+    state.message = data.message;
+    clearInterval(timerInterval);
+    updateGameState(state);
+}));
+
+// Runs on the first connect and after every reconnect. A reconnected socket
+// has a new sid in no rooms, so it joins again and gets a fresh snapshot;
+// without that no delta would reach it to reveal the gap.
+socket.on('connect', () => {
+    if (watchRoom) {
+        socket.emit('join_room', { room_id: watchRoom, role: 'spectator', encoding: 'binary' });
+    } else if (roomId) {
+        socket.emit('join_room', { room_id: roomId, player_id: playerId, ...identity() });
+    } else {
+        // The server cancels a waiting ticket on disconnect
+        findMatch();
+    }
+});
+
+document.getElementById('playerName').value = localStorage.getItem('playerName') || '';
+if (watchRoom) {
+    roomId = watchRoom;
+}
@@ -0,0 +1,103 @@
+import time
+
+# Per-player aggregates, updated by RoomStore.flush() in the same transaction
+# that writes a room's game_over row, so totals never drift from the games
+# table. Reads are index-only lookups and never scan the games table.
+SORTS = {
+    # sort name -> column; ties break on fewer games, then player_key
+    'wins': 'wins',
+    'best_streak': 'best_streak',
+}
+MAX_PAGE = 100
+NAME_LENGTH = 32
+KEY_LENGTH = 64
+
+PLAYER_COLUMNS = ('player_key', 'name', 'games', 'wins', 'solves', 'solved_guesses', 'current_streak',
+                  'best_streak', 'updated_at')
+
+
+def init(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS players
+                 (player_key TEXT PRIMARY KEY, name TEXT, games INTEGER NOT NULL DEFAULT 0,
+                  wins INTEGER NOT NULL DEFAULT 0, solves INTEGER NOT NULL DEFAULT 0,
+                  solved_guesses INTEGER NOT NULL DEFAULT 0, current_streak INTEGER NOT NULL DEFAULT 0,
+                  best_streak INTEGER NOT NULL DEFAULT 0, updated_at REAL)''')
+    for column in SORTS.values():
+        # Covers the leaderboard ORDER BY, so a page is a short index range scan
+        c.execute(f"CREATE INDEX IF NOT EXISTS players_by_{column} "
+                  f"ON players ({column} DESC, games, player_key)")
+
+
+def clean_key(key):
+    # Player keys are opaque client-generated ids; anything else is ignored
+    if isinstance(key, str) and 0 < len(key) <= KEY_LENGTH:
+        return key
+    return None
+
+
+def clean_name(name):
+    if isinstance(name, str) and name.strip():
+        return name.strip()[:NAME_LENGTH]
+    return None
+
+
+def apply(conn, ops):
+    # ops: ('name', (key, name)) or ('result', (winner_key, loser_key, guesses)),
+    # where guesses is the winner's guess count if they cracked the code, else None
+    now = time.time()
+    for op, arg in ops:
+        if op == 'name':
+            key, name = arg
+            conn.execute("INSERT INTO players (player_key, name, updated_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(player_key) DO UPDATE SET name = excluded.name, "
+                         "updated_at = excluded.updated_at", (key, name, now))
+            continue
+        winner_key, loser_key, guesses = arg
+        if winner_key is not None:
+            solved = guesses is not None
+            conn.execute("INSERT INTO players (player_key, games, wins, solves, solved_guesses, current_streak, "
+                         "best_streak, updated_at) VALUES (?, 1, 1, ?, ?, 1, 1, ?) "
+                         "ON CONFLICT(player_key) DO UPDATE SET games = games + 1, wins = wins + 1, "
+                         "solves = solves + excluded.solves, "
+                         "solved_guesses = solved_guesses + excluded.solved_guesses, "
+                         "current_streak = current_streak + 1, "
+                         "best_streak = MAX(best_streak, current_streak + 1), updated_at = excluded.updated_at",
+                         (winner_key, int(solved), guesses or 0, now))
+        if loser_key is not None:
+            conn.execute("INSERT INTO players (player_key, games, updated_at) VALUES (?, 1, ?) "
+                         "ON CONFLICT(player_key) DO UPDATE SET games = games + 1, current_streak = 0, "
+                         "updated_at = excluded.updated_at", (loser_key, now))
+
+
+def to_dict(row):
+    player = dict(zip(PLAYER_COLUMNS, row))
+    player['avg_guesses_to_solve'] = player['solved_guesses'] / player['solves'] if player['solves'] else None
+    return player
+
+
+def encode_cursor(player, sort):
+    return f"{player[SORTS[sort]]}:{player['games']}:{player['player_key']}"
+
+
+def leaderboard(conn, sort='wins', limit=20, after=None):
+    # One page of players ordered by sort. after is the cursor from the previous
+    # page; seeking past it keeps deep pages as cheap as the first.
+    column = SORTS[sort]
+    limit = max(1, min(int(limit), MAX_PAGE))
+    sql = f"SELECT {', '.join(PLAYER_COLUMNS)} FROM players INDEXED BY players_by_{column}"
+    params = []
+    if after:
+        value, games, key = after.split(':', 2)
+        sql += f" WHERE ({column} < ?) OR ({column} = ? AND (games > ? OR (games = ? AND player_key > ?)))"
+        params = [int(value), int(value), int(games), int(games), key]
+    sql += f" ORDER BY {column} DESC, games, player_key LIMIT ?"
+    params.append(limit)
+    players = [to_dict(row) for row in conn.execute(sql, params)]
+    cursor = encode_cursor(players[-1], sort) if len(players) == limit else None
+    return {"players": players, "next": cursor}
+
+
+def player(conn, key):
+    row = conn.execute(f"SELECT {', '.join(PLAYER_COLUMNS)} FROM players WHERE player_key = ?",
+                       (key,)).fetchone()
+    return None if row is None else to_dict(row)
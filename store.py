@@ -0,0 +1,511 @@
+import ast
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import candidates
+import metrics
+import stats
+from dbpool import Overloaded
+from rules import STANDARD, Rules
+
+DEFAULT_MESSAGE = "Waiting for another player to join..."
+
+# 'pvp' pairs two people; in 'vs_ai' the server plays player 2
+MODES = ('pvp', 'vs_ai')
+
+# player1_guesses/player2_guesses are legacy str(list) blobs; guess history
+# now lives in the guesses table, one row per guess.
+COLUMNS = ('room_id', 'player1_secret', 'player2_secret', 'current_player', 'game_over',
+           'winner', 'message', 'setup_phase', 'version', 'mode', 'last_active', 'rules', 'player1_key', 'player2_key')
+
+# Columns added after the original games schema, migrated in place by init_db()
+ADDED_COLUMNS = {
+    'message': "TEXT",
+    'setup_phase': "INTEGER DEFAULT 1",
+    'version': "INTEGER DEFAULT 0",
+    'mode': "TEXT DEFAULT 'pvp'",
+    'last_active': "REAL",
+    # Rules.key; NULL is the standard 4-digit game
+    'rules': "TEXT",
+    # Persistent player identities, see stats.py
+    'player1_key': "TEXT",
+    'player2_key': "TEXT",
+}
+
+# Row writes are version-checked too: a row is only replaced by one at least
+# as new, so a stale writer (e.g. a worker that lost the room) cannot undo a move
+UPSERT_ROOM = (f"INSERT INTO games ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+               f"ON CONFLICT(room_id) DO UPDATE SET "
+               f"{', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:])} "
+               f"WHERE excluded.version >= IFNULL(games.version, 0)")
+
+rooms_evicted = metrics.REGISTRY.counter('mastermind_rooms_evicted_total', 'Rooms evicted by the TTL sweeper')
+transition_conflicts = metrics.REGISTRY.counter('mastermind_transition_conflicts_total',
+                                                'Room transitions that lost a version race, by event')
+
+
+class VersionConflict(Exception):
+    # The room changed, or was evicted, after the caller read it
+    pass
+
+
+class Room:
+    # One live game. Slots keep thousands of rooms cheap to hold in memory.
+    __slots__ = ('room_id', 'player1_secret', 'player2_secret', 'player1_guesses', 'player2_guesses',
+                 'current_player', 'game_over', 'winner', 'message', 'setup_phase', 'version', 'mode',
+                 'last_active', 'rules', 'player1_candidates', 'player2_candidates', 'player1_key',
+                 'player2_key', 'results', 'lock')
+
+    def __init__(self, room_id, mode='pvp', rules=STANDARD):
+        self.room_id = room_id
+        # Held for the length of one transition; see RoomStore.transition
+        self.lock = threading.RLock()
+        self.mode = mode
+        self.rules = rules
+        # Candidate bitsets, see candidates.py; built on first use, not persisted
+        self.player1_candidates = None
+        self.player2_candidates = None
+        # Player results queued by RoomStore.finish; flushed with the room's row
+        self.results = []
+        self.player1_key = None
+        self.player2_key = None
+        self.player1_secret = None
+        self.player2_secret = None
+        self.player1_guesses = []
+        self.player2_guesses = []
+        self.current_player = 1
+        self.game_over = False
+        self.winner = None
+        self.message = DEFAULT_MESSAGE
+        self.setup_phase = True
+        # Bumped on every transition; clients use it to detect missed deltas
+        self.version = 0
+        # Time of the last player action, used for TTL eviction
+        self.last_active = time.time()
+
+    @classmethod
+    def from_row(cls, row):
+        room = cls(row[0])
+        room.player1_secret = row[1]
+        room.player2_secret = row[2]
+        room.current_player = row[3]
+        room.game_over = bool(row[4])
+        room.winner = row[5]
+        room.message = row[6] if row[6] is not None else DEFAULT_MESSAGE
+        room.setup_phase = bool(row[7] if row[7] is not None else 1)
+        room.version = row[8] or 0
+        room.mode = row[9] or 'pvp'
+        room.last_active = row[10] or time.time()
+        room.rules = Rules.parse(row[11]) if row[11] else STANDARD
+        room.player1_key = row[12]
+        room.player2_key = row[13]
+        return room
+
+    def to_row(self):
+        return (self.room_id, self.player1_secret, self.player2_secret, self.current_player,
+                int(self.game_over), self.winner, self.message, int(self.setup_phase), self.version, self.mode,
+                self.last_active, None if self.rules == STANDARD else self.rules.key, self.player1_key,
+                self.player2_key)
+
+    def guesses(self, player):
+        return self.player1_guesses if player == 1 else self.player2_guesses
+
+    def to_state(self):
+        return {
+            # Secrets never leave the server
+            "room_id": self.room_id,
+            "player1_guesses": list(self.player1_guesses),
+            "player2_guesses": list(self.player2_guesses),
+            "current_player": self.current_player,
+            "game_over": self.game_over,
+            "winner": self.winner,
+            "message": self.message,
+            "setup_phase": self.setup_phase,
+            "version": self.version,
+            "mode": self.mode,
+            "rules": self.rules.to_dict(),
+            # Secrets still consistent with each player's guesses; None if not tracked
+            "remaining_count": [candidates.remaining(self, 1), candidates.remaining(self, 2)],
+        }
+
+
+class RoomStore:
+    # Live rooms are kept in memory and are the source of truth. Changed rooms
+    # are written back to the games table in batches by flush().
+
+    def __init__(self, db_path='game.db', flush_interval=1.0, idle_ttl=3600, finished_ttl=600,
+                 sweep_interval=60, archive=None, vacuum_pages=1000, db_pool=None):
+        self.db_path = db_path
+        # Runs the blocking sqlite3 calls, see run_db()
+        self.db_pool = db_pool
+        self.flush_interval = flush_interval
+        # Rooms with no player action for idle_ttl seconds, or finished for
+        # finished_ttl seconds, are evicted by sweep() every sweep_interval
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.sweep_interval = sweep_interval
+        self.archive = archive
+        self.vacuum_pages = vacuum_pages
+        self.owns = None
+        # Called with each evicted room_id, e.g. to drop its turn timer
+        self.on_evict = []
+        self.rooms = {}
+        self.dirty = set()
+        # Ordered guess-table writes: ('insert', row) or ('clear', room_id)
+        self.guess_ops = []
+        # Player aggregate updates for stats.apply, committed with the rooms
+        self.stats_ops = []
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.running = False
+
+    def connect(self):
+        # Several workers may share the file; wait for locks instead of failing
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def run_db(self, fn, *args):
+        # Blocking database work goes through the DB pool when there is one.
+        # fn only touches SQLite: under eventlet or gevent the pool's threads
+        # are real OS threads and must not take the (green) store or room locks.
+        if self.db_pool is None:
+            return fn(*args)
+        return self.db_pool.run(fn, *args)
+
+    def init_db(self):
+        conn = self.connect()
+        c = conn.cursor()
+        # Pages freed by sweep() are released with incremental_vacuum;
+        # switching an existing file over needs one full VACUUM
+        if c.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            c.execute("VACUUM")
+        # WAL lets readers run alongside each worker's batched writes
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute('''CREATE TABLE IF NOT EXISTS games
+                     (room_id TEXT PRIMARY KEY, player1_secret TEXT, player2_secret TEXT,
+                      player1_guesses TEXT, player2_guesses TEXT, current_player INTEGER,
+                      game_over INTEGER, winner TEXT, message TEXT, setup_phase INTEGER DEFAULT 1,
+                      version INTEGER DEFAULT 0, mode TEXT DEFAULT 'pvp')''')
+        existing = {row[1] for row in c.execute("PRAGMA table_info(games)")}
+        for column, decl in ADDED_COLUMNS.items():
+            if column not in existing:
+                c.execute(f"ALTER TABLE games ADD COLUMN {column} {decl}")
+        c.execute('''CREATE TABLE IF NOT EXISTS guesses
+                     (room_id TEXT NOT NULL, player INTEGER NOT NULL, seq INTEGER NOT NULL,
+                      guess TEXT NOT NULL, correct_digits INTEGER, correct_positions INTEGER,
+                      PRIMARY KEY (room_id, player, seq))''')
+        self.migrate_guess_blobs(c)
+        stats.init(c)
+        # Rows from before last_active existed start their TTL now
+        c.execute("UPDATE games SET last_active = ? WHERE last_active IS NULL", (time.time(),))
+        c.execute("CREATE INDEX IF NOT EXISTS games_last_active ON games (last_active)")
+        if self.archive is not None:
+            self.archive.init(conn)
+        conn.commit()
+        conn.close()
+
+    def migrate_guess_blobs(self, c):
+        # Move str(list) guess histories into the guesses table, once per room
+        c.execute("SELECT room_id, player1_guesses, player2_guesses FROM games "
+                  "WHERE player1_guesses IS NOT NULL OR player2_guesses IS NOT NULL")
+        for room_id, blob1, blob2 in c.fetchall():
+            rows = []
+            for player, blob in ((1, blob1), (2, blob2)):
+                for seq, (guess, digits, positions) in enumerate(ast.literal_eval(blob or '[]'), 1):
+                    rows.append((room_id, player, seq, guess, digits, positions))
+            c.executemany("INSERT OR IGNORE INTO guesses VALUES (?, ?, ?, ?, ?, ?)", rows)
+            c.execute("UPDATE games SET player1_guesses = NULL, player2_guesses = NULL WHERE room_id = ?",
+                      (room_id,))
+
+    def load_guesses(self, conn, rooms):
+        c = conn.cursor()
+        for room in rooms:
+            c.execute("SELECT player, guess, correct_digits, correct_positions FROM guesses "
+                      "WHERE room_id = ? ORDER BY player, seq", (room.room_id,))
+            for player, guess, digits, positions in c.fetchall():
+                room.guesses(player).append((guess, digits, positions))
+
+    def load(self, owns=None):
+        # Reload unfinished rooms so games survive a restart. In multi-worker
+        # mode owns(room_id) restricts this to the rooms this worker owns.
+        self.owns = owns
+        conn = self.connect()
+        c = conn.cursor()
+        with metrics.track_db('load'):
+            c.execute(f"SELECT {', '.join(COLUMNS)} FROM games WHERE game_over = 0")
+            rooms = [Room.from_row(row) for row in c.fetchall() if owns is None or owns(row[0])]
+            self.load_guesses(conn, rooms)
+        conn.close()
+        with self.lock:
+            for room in rooms:
+                self.rooms[room.room_id] = room
+        return len(rooms)
+
+    def get(self, room_id):
+        with self.lock:
+            room = self.rooms.get(room_id)
+        if room is not None:
+            return room
+        # Finished games are not loaded at startup; fetch them on demand
+        with metrics.track_db('load_room'):
+            room = self.run_db(self.load_room, room_id)
+        if room is None:
+            return None
+        with self.lock:
+            return self.rooms.setdefault(room_id, room)
+
+    def load_room(self, room_id):
+        conn = self.connect()
+        try:
+            c = conn.cursor()
+            c.execute(f"SELECT {', '.join(COLUMNS)} FROM games WHERE room_id = ?", (room_id,))
+            row = c.fetchone()
+            if row is None:
+                return None
+            room = Room.from_row(row)
+            self.load_guesses(conn, [room])
+            return room
+        finally:
+            conn.close()
+
+    def get_or_create(self, room_id, mode='pvp', rules=STANDARD):
+        # mode and rules only apply when the room is created
+        room = self.get(room_id)
+        if room is not None:
+            return room
+        with self.lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                room = self.rooms[room_id] = Room(room_id, mode, rules)
+                self.dirty.add(room_id)
+        return room
+
+    def mark_dirty(self, room):
+        # Every change is a new room version
+        with self.lock:
+            room.version += 1
+            self.dirty.add(room.room_id)
+            return room.version
+
+    @contextmanager
+    def transition(self, room, expected, event='transition'):
+        # Compare-and-set on the room's version: the block runs, holding only
+        # this room's lock, if nothing has changed the room since the caller
+        # read version `expected`. Validation and scoring happen before, on
+        # that read, so the lock is held just for the mutation and its emits.
+        with room.lock:
+            if room.version != expected or self.rooms.get(room.room_id) is not room:
+                transition_conflicts.inc(event=event)
+                raise VersionConflict(room.room_id)
+            yield room
+
+    def touch(self, room):
+        # A player acted in the room; restarts its idle TTL without a new version
+        with self.lock:
+            room.last_active = time.time()
+            self.dirty.add(room.room_id)
+
+    def set_player(self, room, player, key, name=None):
+        # The first key to join as a player keeps that seat for the room's lifetime
+        key = stats.clean_key(key)
+        if key is None:
+            return
+        name = stats.clean_name(name)
+        with self.lock:
+            if player == 1 and room.player1_key is None:
+                room.player1_key = key
+            elif player == 2 and room.player2_key is None:
+                room.player2_key = key
+            else:
+                return
+            self.dirty.add(room.room_id)
+            if name is not None:
+                self.stats_ops.append(('name', (key, name)))
+
+    def finish(self, room, winner, solved):
+        # Ends the game and queues the players' results on the room. flush()
+        # takes them with the row under the room's lock, so stats commit
+        # atomically with game_over.
+        with room.lock, self.lock:
+            room.game_over = True
+            room.winner = f"Player {winner}"
+            winner_key = room.player1_key if winner == 1 else room.player2_key
+            loser_key = room.player2_key if winner == 1 else room.player1_key
+            guesses = len(room.guesses(winner)) if solved else None
+            room.results.append(('result', (winner_key, loser_key, guesses)))
+            room.version += 1
+            self.dirty.add(room.room_id)
+            return room.version
+
+    def add_guess(self, room, player, guess, correct_digits, correct_positions):
+        # Appends to the in-memory history; persisted as a single-row INSERT
+        with self.lock:
+            history = room.guesses(player)
+            history.append((guess, correct_digits, correct_positions))
+            candidates.narrow(room, player, guess, correct_digits, correct_positions)
+            self.guess_ops.append(('insert', (room.room_id, player, len(history),
+                                              guess, correct_digits, correct_positions)))
+            room.version += 1
+            self.dirty.add(room.room_id)
+        return len(history)
+
+    def clear_guesses(self, room):
+        with self.lock:
+            room.player1_guesses = []
+            room.player2_guesses = []
+            candidates.reset(room)
+            self.guess_ops.append(('clear', room.room_id))
+            room.version += 1
+            self.dirty.add(room.room_id)
+
+    def flush(self):
+        # Snapshot changed rooms under the lock, write them outside it
+        with self.flush_lock:
+            with self.lock:
+                if not self.dirty and not self.guess_ops and not self.stats_ops:
+                    return 0
+                rooms = [self.rooms[room_id] for room_id in self.dirty if room_id in self.rooms]
+                self.dirty.clear()
+            # Each row is read under its room's lock, never mid-transition, and
+            # with the results of the same version. The store lock is not held
+            # meanwhile: transitions take it after theirs.
+            rows = []
+            room_results = []
+            for room in rooms:
+                with room.lock:
+                    rows.append(room.to_row())
+                    room_results += room.results
+                    room.results = []
+            with self.lock:
+                # Ops queued for rooms that have since been evicted are dropped
+                ops = [(op, arg) for op, arg in self.guess_ops
+                       if (arg if op == 'clear' else arg[0]) in self.rooms]
+                results = self.stats_ops + room_results
+                self.guess_ops = []
+                self.stats_ops = []
+            try:
+                with metrics.track_db('flush', phase='db_write'):
+                    self.run_db(self.write, rows, ops, results)
+            except (sqlite3.Error, Overloaded):
+                # Keep the rooms dirty so the next flush retries them
+                with self.lock:
+                    self.dirty.update(row[0] for row in rows)
+                    self.guess_ops = ops + self.guess_ops
+                    self.stats_ops = results + self.stats_ops
+                raise
+            return len(rows)
+
+    def write(self, rows, ops, results):
+        # One flush's rows, guess-table ops and player stats, in one transaction
+        conn = self.connect()
+        try:
+            conn.executemany(UPSERT_ROOM, rows)
+            self.apply_guess_ops(conn, ops)
+            stats.apply(conn, results)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def apply_guess_ops(self, conn, ops):
+        # Runs of inserts go through one executemany; clears keep their order
+        batch = []
+        for op, arg in ops:
+            if op == 'insert':
+                batch.append(arg)
+                continue
+            if batch:
+                conn.executemany("INSERT OR REPLACE INTO guesses VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+            conn.execute("DELETE FROM guesses WHERE room_id = ?", (arg,))
+        if batch:
+            conn.executemany("INSERT OR REPLACE INTO guesses VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+    def expired(self, room, now):
+        if room.game_over:
+            return room.last_active < now - self.finished_ttl
+        return room.last_active < now - self.idle_ttl
+
+    def sweep(self, now=None, batch=500):
+        # Evicts expired rooms from memory and the database, archiving them
+        # first if an archive is configured, then releases a bounded number
+        # of freed pages. Returns the evicted room_ids.
+        now = time.time() if now is None else now
+        self.flush()
+        with self.flush_lock:
+            with self.lock:
+                evicted = [room for room in self.rooms.values() if self.expired(room, now)]
+                for room in evicted:
+                    del self.rooms[room.room_id]
+                    self.dirty.discard(room.room_id)
+            with metrics.track_db('sweep', phase='db_write'):
+                evicted += self.run_db(self.delete_expired, evicted, now, batch)
+        rooms_evicted.inc(len(evicted))
+        for room in evicted:
+            for callback in self.on_evict:
+                callback(room.room_id)
+        return [room.room_id for room in evicted]
+
+    def delete_expired(self, evicted, now, batch):
+        # Archives and deletes the rooms evicted from memory plus expired cold
+        # rows, then releases freed pages. Returns the cold rooms it removed.
+        conn = self.connect()
+        try:
+            cold = self.expired_cold_rooms(conn, now, batch, {room.room_id for room in evicted})
+            removed = evicted + cold
+            if removed:
+                if self.archive is not None:
+                    self.archive.write(conn, removed, now)
+                ids = [(room.room_id,) for room in removed]
+                conn.executemany("DELETE FROM guesses WHERE room_id = ?", ids)
+                conn.executemany("DELETE FROM games WHERE room_id = ?", ids)
+                conn.commit()
+                conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+            return cold
+        finally:
+            conn.close()
+
+    def expired_cold_rooms(self, conn, now, batch, skip):
+        # Expired rows that are not in memory, e.g. finished games never reopened.
+        # skip holds rooms this sweep already took out of memory. Runs on a DB
+        # pool thread, so self.rooms is read without the store lock.
+        c = conn.cursor()
+        c.execute(f"SELECT {', '.join(COLUMNS)} FROM games "
+                  "WHERE (game_over = 1 AND last_active < ?) OR (game_over = 0 AND last_active < ?) "
+                  "ORDER BY last_active LIMIT ?", (now - self.finished_ttl, now - self.idle_ttl, batch))
+        rooms = [Room.from_row(row) for row in c.fetchall()
+                 if row[0] not in self.rooms and row[0] not in skip and (self.owns is None or self.owns(row[0]))]
+        self.load_guesses(conn, rooms)
+        return rooms
+
+    def start(self):
+        # Daemon threads so interpreter exit reaches the atexit flush
+        thread = threading.Thread(target=self.run_flusher, name='room-flusher', daemon=True)
+        thread.start()
+        if self.sweep_interval:
+            threading.Thread(target=self.run_sweeper, name='room-sweeper', daemon=True).start()
+        return thread
+
+    def run_sweeper(self, sleep=time.sleep):
+        while True:
+            sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except (sqlite3.Error, Overloaded):
+                pass
+
+    def run_flusher(self, sleep=time.sleep):
+        self.running = True
+        while self.running:
+            sleep(self.flush_interval)
+            try:
+                self.flush()
+            except (sqlite3.Error, Overloaded):
+                pass
+
+    def close(self):
+        self.running = False
+        # At interpreter exit the pool's threads are already gone; write inline
+        self.db_pool = None
+        self.flush()
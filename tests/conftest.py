@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The game's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def matrix(tmp_path_factory):
+    # The 5040x5040 feedback table, built once per test run into a scratch cache
+    import feedback
+    return feedback.load_matrix(str(tmp_path_factory.mktemp('feedback') / 'feedback_matrix.npy'))
@@ -0,0 +1,80 @@
+import importlib
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    # app configures itself from the environment and opens game.db in the
+    # working directory when imported; both point at scratch space here
+    workdir = tmp_path_factory.mktemp('app')
+    saved_env, saved_cwd = dict(os.environ), os.getcwd()
+    os.environ.update(EVENT_LOG_DIR='', AI_WORKERS='1', DUPLICATE_WINDOW='0', SOCKET_EVENT_RATE='0',
+                      ROOM_EVENT_RATE='0', SWEEP_INTERVAL='0', FEEDBACK_CACHE=str(workdir / 'feedback_matrix.npy'))
+    os.chdir(workdir)
+    app = importlib.import_module('app')
+    try:
+        yield app
+    finally:
+        # Last write to game.db while it is still the relative path's target
+        app.store.close()
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+
+def client(server):
+    return server.socketio.test_client(server.app)
+
+
+def received(client, name):
+    return [message['args'][0] for message in client.get_received() if message['name'] == name]
+
+
+def test_a_taken_seat_is_not_shared(server):
+    a, b, c = client(server), client(server), client(server)
+    a.emit('join_room', {'room_id': 'seats', 'player_id': 1, 'player_key': 'key-a'})
+    b.emit('join_room', {'room_id': 'seats', 'player_id': 2})
+    c.emit('join_room', {'room_id': 'seats', 'player_id': 1, 'player_key': 'key-c'})
+    assert [r['message'] for r in received(c, 'rejected')] == ["Player 1's seat is taken."]
+    c.emit('join_room', {'room_id': 'seats', 'player_id': 2, 'player_key': 'key-c'})
+    assert [r['message'] for r in received(c, 'rejected')] == ["Player 2's seat is taken."]
+
+    room = server.store.get('seats')
+    c.emit('set_secret', {'room_id': 'seats', 'player_id': 1, 'secret': '1234'})
+    assert room.player1_secret is None
+    a.emit('set_secret', {'room_id': 'seats', 'player_id': 1, 'secret': '1234'})
+    b.emit('set_secret', {'room_id': 'seats', 'player_id': 2, 'secret': '5678'})
+    assert not room.setup_phase
+    c.emit('guess', {'room_id': 'seats', 'player_id': 1, 'guess': '5670'})
+    assert room.player1_guesses == []
+    a.emit('guess', {'room_id': 'seats', 'player_id': 1, 'guess': '5670'})
+    assert room.player1_guesses == [('5670', 3, 3)]
+    for each in (a, b, c):
+        each.disconnect()
+
+
+def test_a_player_key_takes_its_seat_back(server):
+    a, b = client(server), client(server)
+    a.emit('join_room', {'room_id': 'rejoin', 'player_id': 1, 'player_key': 'key-a'})
+    # The same player from a new socket, e.g. a second tab or a reconnect
+    b.emit('join_room', {'room_id': 'rejoin', 'player_id': 1, 'player_key': 'key-a'})
+    assert received(b, 'rejected') == []
+    assert list(server.seats.values()).count(('rejoin', 1)) == 1
+    a.emit('set_secret', {'room_id': 'rejoin', 'player_id': 1, 'secret': '1234'})
+    assert server.store.get('rejoin').player1_secret is None
+    b.emit('set_secret', {'room_id': 'rejoin', 'player_id': 1, 'secret': '1234'})
+    assert server.store.get('rejoin').player1_secret == '1234'
+    a.disconnect()
+    b.disconnect()
+
+
+def test_leaving_frees_an_unclaimed_seat(server):
+    a, b = client(server), client(server)
+    a.emit('join_room', {'room_id': 'free', 'player_id': 1})
+    a.disconnect()
+    b.emit('join_room', {'room_id': 'free', 'player_id': 1})
+    assert received(b, 'rejected') == []
+    b.disconnect()
+    assert not any(room_id == 'free' for room_id, _ in server.seat_holders)
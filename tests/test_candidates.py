@@ -0,0 +1,43 @@
+import random
+
+import candidates
+import solver
+from feedback import CODES
+from rules import STANDARD, Rules
+from store import Room
+
+
+def scored(secret, guesses):
+    return [(guess, *STANDARD.score(secret, guess)) for guess in guesses]
+
+
+def test_bitset_matches_the_solver(matrix):
+    rng = random.Random(5)
+    for _ in range(20):
+        history = scored(rng.choice(CODES), rng.sample(CODES, rng.randint(0, 4)))
+        assert list(candidates.indices(candidates.from_history(history))) == list(solver.candidates(history))
+
+
+def test_narrowing_matches_a_rebuild(matrix):
+    rng = random.Random(9)
+    secret = rng.choice(CODES)
+    room = Room('r1', 'pvp')
+    assert candidates.remaining(room, 1) == len(CODES)
+    for guess, correct_digits, correct_positions in scored(secret, rng.sample(CODES, 4)):
+        room.player1_guesses.append((guess, correct_digits, correct_positions))
+        candidates.narrow(room, 1, guess, correct_digits, correct_positions)
+        assert room.player1_candidates == candidates.from_history(room.player1_guesses)
+    assert candidates.remaining(room, 1) == len(solver.candidates(room.player1_guesses))
+    assert CODES.index(secret) in candidates.indices(room.player1_candidates)
+    # Player 2 was never narrowed and is built from their (empty) history on first use
+    assert room.player2_candidates is None
+    assert candidates.remaining(room, 2) == len(CODES)
+
+
+def test_reset_and_untracked_rooms(matrix):
+    room = Room('r1', 'pvp')
+    candidates.bitset(room, 1)
+    candidates.reset(room)
+    assert room.player1_candidates is None
+    variant = Room('r2', 'pvp', Rules(5, '0123456789', True))
+    assert candidates.bitset(variant, 1) is None and candidates.remaining(variant, 1) is None
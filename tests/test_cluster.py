@@ -0,0 +1,99 @@
+import queue
+
+import pytest
+
+import metrics
+from cluster import Cluster, LocalBus
+
+
+class Worker:
+    # One Cluster with a fake handle: events run here, directly or forwarded,
+    # land in a queue tagged with how they arrived
+    def __init__(self, bus, worker_id, worker_count):
+        self.cluster = Cluster(bus, worker_id, worker_count)
+        self.received = queue.Queue()
+        self.cluster.start(self.handle_forwarded)
+
+    def handle_forwarded(self, event, data, sid):
+        if data.get('fail'):
+            raise RuntimeError("handler failed")
+        self.received.put(('forwarded', event, data, sid))
+
+    def handle_local(self, event, data, sid):
+        self.received.put(('local', event, data, sid))
+
+    def route(self, event, data, sid):
+        self.cluster.route(event, data, sid, self.handle_local)
+
+    def route_lobby(self, event, data, sid):
+        self.cluster.route_lobby(event, data, sid, self.handle_local)
+
+    def next(self):
+        return self.received.get(timeout=2)
+
+    def idle(self):
+        return self.received.empty()
+
+
+@pytest.fixture
+def workers():
+    bus = LocalBus()
+    return [Worker(bus, worker_id, 2) for worker_id in range(2)]
+
+
+def room_owned_by(cluster, worker_id):
+    return next(f"room-{n}" for n in range(1000) if cluster.owner(f"room-{n}") == worker_id)
+
+
+def test_every_room_has_exactly_one_owner():
+    clusters = [Cluster(LocalBus(), worker_id, 3) for worker_id in range(3)]
+    for n in range(300):
+        owners = [c.worker_id for c in clusters if c.owns(f"room-{n}")]
+        assert owners == [clusters[0].owner(f"room-{n}")]
+    assert len({clusters[0].owner(f"room-{n}") for n in range(300)}) == 3
+
+
+def test_single_worker_owns_everything_and_needs_no_queue():
+    cluster = Cluster()
+    assert cluster.owns('anything') and cluster.owns_lobby()
+    assert cluster.start(lambda *args: None) is None
+
+
+def test_invalid_configurations_are_rejected():
+    with pytest.raises(ValueError):
+        Cluster(None, 0, 2)
+    with pytest.raises(ValueError):
+        Cluster(LocalBus(), 2, 2)
+
+
+def test_owned_room_events_run_locally(workers):
+    room_id = room_owned_by(workers[0].cluster, 0)
+    workers[0].route('guess', {'room_id': room_id, 'guess': '1234'}, 'sid-a')
+    assert workers[0].next() == ('local', 'guess', {'room_id': room_id, 'guess': '1234'}, 'sid-a')
+    assert workers[0].cluster.forwarded == 0 and workers[1].idle()
+
+
+def test_join_and_guess_are_forwarded_to_the_owner(workers):
+    room_id = room_owned_by(workers[0].cluster, 1)
+    workers[0].route('join_room', {'room_id': room_id, 'player_id': 1}, 'sid-a')
+    workers[0].route('guess', {'room_id': room_id, 'guess': '1234'}, 'sid-a')
+    assert workers[1].next() == ('forwarded', 'join_room', {'room_id': room_id, 'player_id': 1}, 'sid-a')
+    assert workers[1].next() == ('forwarded', 'guess', {'room_id': room_id, 'guess': '1234'}, 'sid-a')
+    assert workers[0].cluster.forwarded == 2 and workers[0].idle()
+
+
+def test_find_match_goes_to_the_lobby_owner(workers):
+    workers[1].route_lobby('find_match', {'rules': ''}, 'sid-b')
+    assert workers[0].next() == ('forwarded', 'find_match', {'rules': ''}, 'sid-b')
+    workers[0].route_lobby('find_match', {'rules': ''}, 'sid-a')
+    assert workers[0].next() == ('local', 'find_match', {'rules': ''}, 'sid-a')
+    assert workers[1].idle()
+
+
+def test_a_failing_forwarded_event_is_counted_and_the_listener_keeps_going(workers):
+    before = metrics.event_errors.totals().get((('event', 'guess'),), 0)
+    room_id = room_owned_by(workers[0].cluster, 1)
+    workers[0].route('guess', {'room_id': room_id, 'fail': True}, 'sid-a')
+    workers[0].route('join_room', {'room_id': room_id}, 'sid-a')
+    assert workers[1].next() == ('forwarded', 'join_room', {'room_id': room_id}, 'sid-a')
+    assert metrics.event_errors.totals()[(('event', 'guess'),)] == before + 1
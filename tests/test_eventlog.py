@@ -0,0 +1,53 @@
+import eventlog
+from rules import STANDARD, Rules
+from store import Room
+
+
+def play(log, room, kind, *args):
+    room.version += 1
+    getattr(log, kind)(room, *args)
+    return room.version
+
+
+def unlogged(room):
+    # A transition the log does not record: the turn change after a guess or a message update
+    room.version += 1
+
+
+def test_event_log_round_trip(tmp_path):
+    # A small segment size forces rollovers; each segment names its own rooms
+    log = eventlog.EventLog(str(tmp_path), segment_bytes=128)
+    variant = Room('sala-ñ', 'pvp', Rules(6, '0123456789AB', True))
+    classic = Room('classic', 'vs_ai')
+    play(log, variant, 'secret', 1, 'AB00B1')
+    play(log, variant, 'secret', 2, '999999')
+    play(log, classic, 'secret', 1, '1234')
+    play(log, classic, 'secret', 2, '5678')
+    play(log, variant, 'guess', 1, '999990', 5, 5)
+    play(log, variant, 'turn', 2)
+    variant_version = play(log, variant, 'guess', 2, 'AB00B1', 6, 6)
+    play(log, classic, 'guess', 1, '8765', 4, 0)
+    unlogged(classic)
+    play(log, classic, 'restart')
+    play(log, classic, 'secret', 1, '0123')
+    play(log, classic, 'secret', 2, '4567')
+    classic_version = play(log, classic, 'forfeit', 2)
+    unlogged(classic)
+    log.close()
+
+    assert len(eventlog.segment_paths(str(tmp_path))) > 1
+    rooms = eventlog.replay(eventlog.read_events(str(tmp_path)))
+
+    rebuilt = rooms['sala-ñ']
+    assert rebuilt.rules == variant.rules
+    assert (rebuilt.player1_secret, rebuilt.player2_secret) == ('AB00B1', '999999')
+    assert rebuilt.player1_guesses == [('999990', 5, 5)]
+    assert rebuilt.player2_guesses == [('AB00B1', 6, 6)]
+    assert (rebuilt.game_over, rebuilt.winner, rebuilt.version) == (True, 'Player 2', variant_version)
+
+    rebuilt = rooms['classic']
+    assert (rebuilt.mode, rebuilt.rules) == ('vs_ai', STANDARD)
+    assert (rebuilt.player1_secret, rebuilt.player2_secret) == ('0123', '4567')
+    assert rebuilt.player1_guesses == []
+    assert (rebuilt.game_over, rebuilt.winner, rebuilt.version) == (True, 'Player 2', classic_version)
+    assert rebuilt.version < classic.version
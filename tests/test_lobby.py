@@ -0,0 +1,52 @@
+from lobby import Lobby
+
+
+def test_the_next_player_is_paired_with_the_waiting_one():
+    lobby = Lobby()
+    assert lobby.enqueue('a') is None
+    room_id, first, second = lobby.enqueue('b')
+    assert (first, second) == ('a', 'b')
+    assert room_id.startswith('match-')
+    assert lobby.enqueue('c') is None
+    other_room, first, second = lobby.enqueue('d')
+    assert (first, second) == ('c', 'd') and other_room != room_id
+    assert lobby.stats()['waiting'] == 0
+
+
+def test_buckets_split_by_region_skill_and_rules():
+    lobby = Lobby(skill_bucket_size=100)
+    assert lobby.enqueue('a', region='eu', skill=150, variant='4:0123456789:0') is None
+    assert lobby.enqueue('b', region='us', skill=150, variant='4:0123456789:0') is None
+    assert lobby.enqueue('c', region='eu', skill=250, variant='4:0123456789:0') is None
+    assert lobby.enqueue('d', region='eu', skill=150, variant='5:0123456789:0') is None
+    assert lobby.stats()['buckets'] == 4
+    # Same region, skill range and rules as 'a'
+    assert lobby.enqueue('e', region='eu', skill=199, variant='4:0123456789:0')[1:] == ('a', 'e')
+    assert lobby.stats()['buckets'] == 3
+
+
+def test_a_waiting_player_cannot_queue_twice():
+    lobby = Lobby()
+    assert lobby.enqueue('a') is None
+    assert lobby.enqueue('a') is None
+    assert lobby.stats()['waiting'] == 1
+
+
+def test_cancel_removes_the_ticket():
+    lobby = Lobby()
+    lobby.enqueue('a')
+    assert lobby.cancel('a') is True
+    assert lobby.cancel('a') is False
+    assert lobby.stats() == {"waiting": 0, "buckets": 0, "matches": 0,
+                             "wait_avg_ms": 0.0, "wait_max_ms": 0.0}
+    # The cancelled player is not matched with the next one
+    assert lobby.enqueue('b') is None
+
+
+def test_stats_count_matches():
+    lobby = Lobby()
+    for sid in 'abcd':
+        lobby.enqueue(sid)
+    stats = lobby.stats()
+    assert stats['matches'] == 2 and stats['waiting'] == 0
+    assert stats['wait_max_ms'] >= stats['wait_avg_ms'] >= 0
@@ -0,0 +1,89 @@
+import queue
+from types import SimpleNamespace
+
+from ratelimit import OutboundLimit, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_refill():
+    clock = Clock()
+    limiter = RateLimiter(rate=2, burst=3, clock=clock)
+    assert [limiter.allow('a') for _ in range(4)] == [True, True, True, False]
+    # Keys have their own buckets
+    assert limiter.allow('b')
+    clock.now = 0.5
+    assert limiter.allow('a') and not limiter.allow('a')
+    # Refill stops at the burst size
+    clock.now = 100
+    assert [limiter.allow('a') for _ in range(4)] == [True, True, True, False]
+
+
+def test_cost_is_taken_from_the_bucket():
+    clock = Clock()
+    limiter = RateLimiter(rate=1, burst=5, clock=clock)
+    assert limiter.allow('a', cost=4)
+    assert not limiter.allow('a', cost=2)
+    assert limiter.allow('a', cost=1)
+
+
+def test_zero_rate_disables_the_limit():
+    limiter = RateLimiter(rate=0, burst=0, clock=Clock())
+    assert all(limiter.allow('a') for _ in range(1000))
+    assert limiter.buckets == {}
+
+
+def test_full_buckets_are_pruned_and_discard_resets():
+    clock = Clock()
+    limiter = RateLimiter(rate=1, burst=2, clock=clock, prune_every=3)
+    limiter.allow('a')
+    clock.now = 1
+    limiter.allow('b')
+    clock.now = 2
+    # The third call prunes 'a', refilled since 0, but not 'b', refilled at 3
+    limiter.allow('c')
+    assert set(limiter.buckets) == {'b', 'c'}
+    limiter.allow('c')
+    limiter.allow('c')
+    assert not limiter.allow('c')
+    limiter.discard('c')
+    assert limiter.allow('c')
+
+
+def fake_server(queued):
+    # Just the engine.io sockets OutboundLimit reads queue sizes from
+    sockets = {}
+    for eio_sid, size in queued.items():
+        packets = queue.Queue()
+        for n in range(size):
+            packets.put(n)
+        sockets[eio_sid] = SimpleNamespace(queue=packets)
+    return SimpleNamespace(eio=SimpleNamespace(sockets=sockets))
+
+
+def test_slow_consumers_are_disconnected_once():
+    disconnected = []
+    limit = OutboundLimit(fake_server({'e1': 2, 'e2': 5, 'e3': 4}), max_queued=4, disconnect=disconnected.append)
+    recipients = {'s1': 'e1', 's2': 'e2', 's3': 'e3', 'gone': 'e4'}
+    limit.check(recipients)
+    assert sorted(disconnected) == ['s2', 's3']
+    # Still over the limit, but already being closed
+    limit.check(recipients)
+    assert sorted(disconnected) == ['s2', 's3']
+    limit.closed('s2')
+    limit.check(recipients)
+    assert sorted(disconnected) == ['s2', 's2', 's3']
+
+
+def test_zero_max_queued_disables_the_check():
+    disconnected = []
+    limit = OutboundLimit(fake_server({'e1': 100}), max_queued=0, disconnect=disconnected.append)
+    limit.check({'s1': 'e1'})
+    limit.check(None)
+    assert disconnected == []
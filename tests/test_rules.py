@@ -0,0 +1,55 @@
+import random
+from collections import Counter
+
+import pytest
+
+from rules import HEX_DIGITS, MAX_LENGTH, MAX_SYMBOLS, MIN_LENGTH, STANDARD, Rules, from_request
+
+
+def reference_score(secret, guess):
+    positions = sum(s == g for s, g in zip(secret, guess))
+    secret_counts, guess_counts = Counter(secret), Counter(guess)
+    digits = sum(min(count, guess_counts[symbol]) for symbol, count in secret_counts.items())
+    return digits, positions
+
+
+def random_code(rng, rules):
+    if rules.repeats:
+        return ''.join(rng.choice(rules.alphabet) for _ in range(rules.length))
+    return ''.join(rng.sample(rules.alphabet, rules.length))
+
+
+def test_score_matches_reference():
+    rng = random.Random(7)
+    for length in range(MIN_LENGTH, MAX_LENGTH + 1):
+        for symbols in range(2, MAX_SYMBOLS + 1):
+            for repeats in (False, True):
+                if not repeats and length > symbols:
+                    continue
+                rules = Rules(length, ''.join(rng.sample(HEX_DIGITS, symbols)), repeats)
+                for _ in range(50):
+                    secret, guess = random_code(rng, rules), random_code(rng, rules)
+                    assert rules.score(secret, guess) == reference_score(secret, guess), (rules, secret, guess)
+                    assert rules.score(secret, secret) == (length, length)
+
+
+def test_score_extremes():
+    rules = Rules(8, HEX_DIGITS, True)
+    assert rules.score('FFFFFFFF', 'FFFFFFFF') == (8, 8)
+    assert rules.score('FFFFFFFF', '00000000') == (0, 0)
+    assert rules.score('0000FFFF', 'FFFF0000') == (8, 0)
+    assert STANDARD.score('1234', '4321') == (4, 0)
+
+
+@pytest.mark.parametrize('alphabet', ['<img src=x>', '01234&', 'ab c', '0123456789ABCDEFG', '0012'])
+def test_alphabets_are_distinct_letters_or_digits(alphabet):
+    with pytest.raises(ValueError):
+        Rules(3, alphabet, True)
+    assert from_request({'rules': f"3:{alphabet}:1"}) == STANDARD
+    assert from_request({'length': 3, 'alphabet': alphabet, 'repeats': True}) == STANDARD
+
+
+def test_requested_rules_round_trip():
+    rules = from_request({'length': 5, 'alphabet': 'abcXYZ', 'repeats': True})
+    assert rules == Rules(5, 'abcXYZ', True)
+    assert Rules.parse(rules.key) is rules
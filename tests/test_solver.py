@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+import solver
+from feedback import CODES, CODE_INDEX
+from rules import STANDARD
+
+
+def play(secret, strategy, limit=10):
+    # Guesses until solved; returns the history
+    history = []
+    while len(history) < limit:
+        guess = solver.recommend(history, strategy).guess
+        history.append((guess, *STANDARD.score(secret, guess)))
+        if guess == secret:
+            return history
+    pytest.fail(f"{strategy} did not solve {secret} in {limit} guesses")
+
+
+def test_candidates_are_exactly_the_consistent_codes(matrix):
+    rng = random.Random(3)
+    secret = rng.choice(CODES)
+    history = [(guess, *STANDARD.score(secret, guess)) for guess in rng.sample(CODES, 3)]
+    expected = [i for i, code in enumerate(CODES)
+                if all(STANDARD.score(code, guess) == (digits, positions) for guess, digits, positions in history)]
+    assert list(solver.candidates(history)) == expected
+    assert CODE_INDEX[secret] in expected
+
+
+@pytest.mark.parametrize('strategy', ['minimax', 'entropy', 'first'])
+def test_strategies_solve(matrix, strategy):
+    rng = random.Random(11)
+    for secret in rng.sample(CODES, 10):
+        history = play(secret, strategy)
+        assert len(history) <= (8 if strategy != 'first' else 10)
+
+
+def test_inconsistent_history_has_no_guess(matrix):
+    history = [('0123', 4, 4), ('4567', 4, 4)]
+    suggestion = solver.recommend(history)
+    assert len(suggestion.candidates) == 0 and suggestion.guess is None
+
+
+def test_unknown_strategy_is_rejected(matrix):
+    with pytest.raises(ValueError):
+        solver.recommend([], 'random')
+    with pytest.raises(ValueError):
+        solver.candidates([('0000', 0, 0)])
+
+
+@pytest.mark.parametrize('strategy', solver.STRATEGIES)
+def test_openings_are_not_fixed(matrix, strategy):
+    openings = {solver.recommend([], strategy).guess for _ in range(20)}
+    assert len(openings) > 1
+    assert openings <= set(CODES)
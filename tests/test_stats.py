@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+import stats
+from store import Room, RoomStore
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    stats.init(conn)
+    yield conn
+    conn.close()
+
+
+def test_leaderboard_pages_through_ties(conn):
+    # Five players on 3 wins, split by games played, then by key
+    ops = []
+    for key, wins, losses in [('a', 3, 0), ('b', 3, 1), ('c', 3, 1), ('d', 3, 0), ('e', 3, 2),
+                              ('f', 5, 0), ('g', 1, 0)]:
+        ops += [('result', (key, None, None))] * wins + [('result', (None, key, None))] * losses
+    stats.apply(conn, ops)
+    keys = []
+    after = None
+    while True:
+        page = stats.leaderboard(conn, 'wins', limit=2, after=after)
+        keys += [player['player_key'] for player in page['players']]
+        after = page['next']
+        if after is None:
+            break
+    assert keys == ['f', 'a', 'd', 'b', 'c', 'e', 'g']
+
+
+def test_names_and_streaks(conn):
+    stats.apply(conn, [('name', ('a', 'Ada')), ('result', ('a', 'b', 4)), ('result', ('a', 'b', None)),
+                       ('result', ('b', 'a', 6))])
+    a, b = stats.player(conn, 'a'), stats.player(conn, 'b')
+    assert (a['name'], a['games'], a['wins'], a['solves'], a['solved_guesses']) == ('Ada', 3, 2, 1, 4)
+    assert (a['current_streak'], a['best_streak']) == (0, 2)
+    assert (b['games'], b['wins'], b['current_streak']) == (3, 1, 1)
+    assert stats.player(conn, 'nobody') is None
+
+
+def test_a_result_is_written_with_its_game_over_row(tmp_path, monkeypatch):
+    store = RoomStore(str(tmp_path / 'game.db'), sweep_interval=0)
+    store.init_db()
+    rooms = [store.get_or_create(room_id) for room_id in ('r1', 'r2')]
+    for room in rooms:
+        store.set_player(room, 1, f"{room.room_id}-p1")
+        store.set_player(room, 2, f"{room.room_id}-p2")
+    store.flush()
+
+    # Finish whichever room flush() serializes first while it serializes the second
+    to_row = Room.to_row
+    serialized = []
+
+    def racing_to_row(room):
+        if len(serialized) == 1:
+            store.finish(serialized[0], 1, True)
+        serialized.append(room)
+        return to_row(room)
+
+    monkeypatch.setattr(Room, 'to_row', racing_to_row)
+    for room in rooms:
+        store.mark_dirty(room)
+    store.flush()
+    monkeypatch.setattr(Room, 'to_row', to_row)
+    finished = serialized[0]
+
+    conn = sqlite3.connect(store.db_path)
+    game_over = "SELECT game_over FROM games WHERE room_id = ?"
+    # Neither the game_over row nor the result made it into that flush
+    assert conn.execute(game_over, (finished.room_id,)).fetchone() == (0,)
+    assert stats.player(conn, f"{finished.room_id}-p1") is None
+    store.flush()
+    assert conn.execute(game_over, (finished.room_id,)).fetchone() == (1,)
+    assert stats.player(conn, f"{finished.room_id}-p1")['wins'] == 1
+    assert stats.player(conn, f"{finished.room_id}-p2")['games'] == 1
+    conn.close()
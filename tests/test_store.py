@@ -0,0 +1,49 @@
+import sqlite3
+
+import pytest
+
+from store import UPSERT_ROOM, RoomStore, VersionConflict
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = RoomStore(str(tmp_path / 'game.db'), sweep_interval=0)
+    store.init_db()
+    return store
+
+
+def test_transition_commits_at_expected_version(store):
+    room = store.get_or_create('r1')
+    with store.transition(room, room.version, 'test'):
+        store.mark_dirty(room)
+    assert room.version == 1
+
+
+def test_transition_conflicts_on_a_newer_version(store):
+    room = store.get_or_create('r1')
+    expected = room.version
+    store.mark_dirty(room)
+    with pytest.raises(VersionConflict):
+        with store.transition(room, expected, 'test'):
+            pytest.fail("ran against a stale version")
+
+
+def test_transition_conflicts_on_an_evicted_room(store):
+    room = store.get_or_create('r1')
+    del store.rooms['r1']
+    with pytest.raises(VersionConflict):
+        with store.transition(room, room.version, 'test'):
+            pytest.fail("ran against an evicted room")
+
+
+def test_stale_row_does_not_overwrite_a_newer_one(store):
+    room = store.get_or_create('r1')
+    stale = room.to_row()
+    room.message = "newer"
+    store.mark_dirty(room)
+    store.flush()
+    conn = sqlite3.connect(store.db_path)
+    conn.execute(UPSERT_ROOM, stale)
+    conn.commit()
+    assert conn.execute("SELECT message, version FROM games WHERE room_id = 'r1'").fetchone() == ("newer", 1)
+    conn.close()
@@ -0,0 +1,72 @@
+from timers import TurnTimers
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_timers():
+    clock = Clock()
+    expired = []
+    return TurnTimers(expired.append, clock=clock), clock, expired
+
+
+def test_only_passed_deadlines_expire():
+    timers, clock, _ = make_timers()
+    timers.schedule('a', 10)
+    timers.schedule('b', 20)
+    clock.now = 15
+    assert timers.pop_expired() == ['a']
+    assert timers.remaining('a') is None
+    assert timers.remaining('b') == 5
+    clock.now = 25
+    assert timers.pop_expired() == ['b']
+    assert timers.pop_expired() == []
+
+
+def test_reschedule_replaces_the_deadline():
+    timers, clock, _ = make_timers()
+    timers.schedule('a', 10)
+    clock.now = 5
+    timers.schedule('a', 10)
+    clock.now = 12
+    # The first entry is still in the heap but no longer current
+    assert timers.pop_expired() == []
+    assert timers.remaining('a') == 3
+    clock.now = 15
+    assert timers.pop_expired() == ['a']
+
+
+def test_cancel_drops_the_deadline():
+    timers, clock, _ = make_timers()
+    timers.schedule('a', 10)
+    timers.cancel('a')
+    clock.now = 20
+    assert timers.pop_expired() == []
+    assert timers.remaining('a') is None
+
+
+def test_run_calls_back_and_survives_errors():
+    clock = Clock()
+    calls = []
+
+    def on_expire(room_id):
+        calls.append(room_id)
+        if room_id == 'bad':
+            raise RuntimeError("boom")
+
+    timers = TurnTimers(on_expire, clock=clock)
+    timers.schedule('bad', 1)
+    timers.schedule('good', 2)
+    clock.now = 5
+
+    def sleep(seconds):
+        if calls:
+            timers.stop()
+
+    timers.run(sleep=sleep)
+    assert calls == ['bad', 'good']
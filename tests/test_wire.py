@@ -0,0 +1,109 @@
+import json
+
+import socketio
+from socketio import packet
+
+import spectate
+import wire
+from store import Room
+
+
+def make_room():
+    room = Room('sala-ñ', 'pvp')
+    room.message = 'Player 2\'s turn: "quote" & <tag>'
+    room.player1_guesses.append(('0123', 2, 1))
+    room.version = 7
+    return room
+
+
+def decode(encoded):
+    # What a client sees, as the Flask-SocketIO test client decodes it
+    if isinstance(encoded, list):
+        pkt = packet.Packet(encoded_packet=encoded[0])
+        for attachment in encoded[1:]:
+            pkt.add_attachment(attachment)
+        return pkt.data
+    return packet.Packet(encoded_packet=encoded).data
+
+
+def as_json(data):
+    # Guesses are tuples in memory and arrays on the wire
+    return json.loads(json.dumps(data))
+
+
+def test_json_text_matches_the_payload():
+    cache = wire.SnapshotCache()
+    room = make_room()
+    data, size = cache.payload(room, 'json', 25)
+    text = cache.text(room, 25)
+    assert json.loads(text) == as_json(data) and data['timer'] == 25
+    assert len(text) == size == len(json.dumps(data, separators=(',', ':')))
+
+
+def test_encoded_packets_decode_to_the_payload():
+    server = socketio.Server()
+    cache = wire.SnapshotCache()
+    room = make_room()
+    data, _ = cache.payload(room, 'json', 3)
+    encoded = spectate.encode_text(server, 'game_state', cache.text(room, 3))
+    assert encoded == spectate.encode(server, 'game_state', data)
+    assert decode(encoded) == ['game_state', as_json(data)]
+    body, _ = cache.payload(room, 'binary', 3)
+    assert decode(spectate.encode(server, 'game_state', body)) == ['game_state', body]
+
+
+def test_binary_header_and_timer():
+    cache = wire.SnapshotCache()
+    room = make_room()
+    body, size = cache.payload(room, 'binary', 70000)
+    assert size == len(body)
+    version, flags, player, winner, room_version = wire.HEADER.unpack_from(body)[:5]
+    assert (version, flags, player, winner, room_version) == (wire.WIRE_VERSION, wire.SETUP_PHASE, 1, 0, 7)
+    # The timer is clamped to its 16-bit field
+    assert wire.TIMER.unpack(body[-2:]) == (0xFFFF,)
+
+
+def test_cache_is_kept_per_version():
+    cache = wire.SnapshotCache()
+    room = make_room()
+    first = cache.get(room, 'json')
+    assert cache.get(room, 'json') is first
+    binary = cache.get(room, 'binary')
+    assert cache.get(room, 'json') is first
+    room.message = 'changed'
+    room.version += 1
+    second = cache.get(room, 'json')
+    assert second is not first and second[0]['message'] == 'changed'
+    assert cache.get(room, 'binary') is not binary
+    cache.discard(room.room_id)
+    assert cache.get(room, 'json') is not second
+
+
+class Manager:
+    def __init__(self, rooms):
+        self.rooms = {'/': rooms}
+
+    def get_participants(self, namespace, room):
+        for sid, eio_sid in self.rooms[namespace][room].items():
+            yield sid, eio_sid
+
+
+class Server:
+    # Just what spectate.write touches; records each socket's packets
+    packet_class = packet.Packet
+
+    def __init__(self, rooms):
+        self.manager = Manager(rooms)
+        self.sent = []
+
+    def _send_packet(self, eio_sid, pkt):
+        self.sent.append((eio_sid, pkt.encode()))
+
+
+def test_write_sends_one_encoding_in_batches():
+    server = Server({'watchers': {f"sid{n}": f"eio{n}" for n in range(5)}})
+    pauses = []
+    assert spectate.write(server, '2["x",1]', 'watchers', batch_size=2, pause=lambda: pauses.append(1)) == 5
+    assert server.sent == [(f"eio{n}", '2["x",1]') for n in range(5)]
+    assert len(pauses) == 2
+    assert spectate.write(server, '2["x",1]', 'nobody') == 0
@@ -0,0 +1,75 @@
+import heapq
+import logging
+import threading
+import time
+
+import metrics
+
+log = logging.getLogger('mastermind.timers')
+
+
+class TurnTimers:
+    # Turn deadlines for every room in one heap, driven by a single loop.
+    # Rescheduling or cancelling leaves the old heap entry in place; it is
+    # skipped when popped because its token no longer matches the room's.
+
+    def __init__(self, on_expire, tick=0.25, clock=time.monotonic):
+        self.on_expire = on_expire
+        self.tick = tick
+        self.clock = clock
+        self.heap = []
+        self.deadlines = {}  # room_id -> (deadline, token)
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.running = False
+
+    def schedule(self, room_id, seconds):
+        with self.lock:
+            self.counter += 1
+            deadline = self.clock() + seconds
+            self.deadlines[room_id] = (deadline, self.counter)
+            heapq.heappush(self.heap, (deadline, self.counter, room_id))
+
+    def cancel(self, room_id):
+        with self.lock:
+            self.deadlines.pop(room_id, None)
+
+    def remaining(self, room_id):
+        # Seconds left in the room's current turn, or None if no turn is running
+        with self.lock:
+            entry = self.deadlines.get(room_id)
+        if entry is None:
+            return None
+        return max(0.0, entry[0] - self.clock())
+
+    def pop_expired(self):
+        # Only entries whose deadline has passed are touched
+        now = self.clock()
+        expired = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, token, room_id = heapq.heappop(self.heap)
+                if self.deadlines.get(room_id) == (deadline, token):
+                    del self.deadlines[room_id]
+                    expired.append(room_id)
+        return expired
+
+    def run(self, sleep=time.sleep):
+        self.running = True
+        while self.running:
+            sleep(self.tick)
+            for room_id in self.pop_expired():
+                try:
+                    self.on_expire(room_id)
+                except Exception:
+                    # One bad room must not stop every other room's clock
+                    log.exception("turn timeout failed for room %s", room_id)
+                    metrics.event_errors.inc(event='turn_timeout')
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name='turn-timers', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,117 @@
+import json
+import struct
+import threading
+
+import candidates
+import metrics
+from rules import STANDARD
+
+# Outbound game_state encodings a client can ask for when joining a room
+FORMATS = ('json', 'binary')
+
+# Binary game_state, all big-endian:
+#   header   format version, flags, current player, winner (0 = none),
+#            room version, remaining counts for players 1 and 2
+#   strings  room_id (u16 length), Rules.key (u8 length, 0 = standard), message (u16 length)
+#   guesses  u16 count for player 1, u16 count for player 2, then one record
+#            each: code packed by Rules.encode, packed feedback byte
+#   timer    u16 seconds left in the turn, appended per send
+WIRE_VERSION = 1
+HEADER = struct.Struct('>BBBBIII')
+GUESS = struct.Struct('>IB')
+COUNTS = struct.Struct('>HH')
+TIMER = struct.Struct('>H')
+GAME_OVER, SETUP_PHASE, VS_AI = 1, 2, 4
+NO_COUNT = 0xFFFFFFFF
+
+snapshot_cache = metrics.REGISTRY.counter('mastermind_snapshot_cache_total',
+                                          'game_state encodings served from or added to the cache, by result')
+
+
+def format_room(room_id, fmt):
+    # Full snapshots go to one Socket.IO room per encoding; deltas go to room_id
+    return f"{room_id}#{fmt}"
+
+
+def watch_room(room_id, fmt):
+    # Spectators only get the coalesced snapshots sent to this room, never deltas
+    return f"{room_id}#watch#{fmt}"
+
+
+def prefixed(text, width='B'):
+    data = text.encode('utf-8')
+    return struct.pack('>' + width, len(data)) + data
+
+
+def encode_binary(room):
+    rules = room.rules
+    flags = (GAME_OVER * room.game_over) | (SETUP_PHASE * room.setup_phase) | (VS_AI * (room.mode == 'vs_ai'))
+    winner = int(room.winner.split()[-1]) if room.winner else 0
+    remaining = [candidates.remaining(room, player) for player in (1, 2)]
+    encode = rules.encode
+    parts = [
+        HEADER.pack(WIRE_VERSION, flags, room.current_player, winner, room.version,
+                    *(NO_COUNT if n is None else n for n in remaining)),
+        prefixed(room.room_id, 'H'),
+        prefixed('' if rules == STANDARD else rules.key),
+        prefixed(room.message, 'H'),
+        COUNTS.pack(len(room.player1_guesses), len(room.player2_guesses)),
+    ]
+    parts.extend(GUESS.pack(encode(guess), (digits << 4) | positions)
+                 for guess, digits, positions in room.player1_guesses)
+    parts.extend(GUESS.pack(encode(guess), (digits << 4) | positions)
+                 for guess, digits, positions in room.player2_guesses)
+    return b''.join(parts)
+
+
+class SnapshotCache:
+    # One encoding per room version and format, shared by every recipient
+    # until the room changes. Entries hold the JSON-ready state with its
+    # serialized text, and the binary body; the turn timer is added per send.
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, room, fmt):
+        index = 1 if fmt == 'json' else 2
+        with self.lock:
+            entry = self.entries.get(room.room_id)
+            if entry is not None and entry[0] == room.version and entry[index] is not None:
+                snapshot_cache.inc(result='hit')
+                return entry[index]
+        # Under the room's lock so the encoding matches the version it is cached under
+        with room.lock:
+            version = room.version
+            if fmt == 'json':
+                state = room.to_state()
+                value = (state, json.dumps(state, separators=(',', ':')))
+            else:
+                value = encode_binary(room)
+        snapshot_cache.inc(result='miss')
+        with self.lock:
+            entry = self.entries.get(room.room_id)
+            if entry is None or entry[0] != version:
+                entry = self.entries[room.room_id] = [version, None, None]
+            entry[index] = value
+        return value
+
+    def discard(self, room_id):
+        with self.lock:
+            self.entries.pop(room_id, None)
+
+    def payload(self, room, fmt, timer):
+        # Returns (payload, size in bytes) for one game_state emit
+        if fmt == 'binary':
+            body = self.get(room, 'binary')
+            data = body + TIMER.pack(max(0, min(int(timer), 0xFFFF)))
+            return data, len(data)
+        state, text = self.get(room, 'json')
+        # ',"timer":N' on top of the cached text
+        return dict(state, timer=timer), len(text) + 9 + len(str(timer))
+
+    def text(self, room, timer):
+        # The JSON payload already serialized: the cached text with the timer
+        # spliced in, equal to json.dumps of payload() with compact separators
+        _, text = self.get(room, 'json')
+        return f'{text[:-1]},"timer":{int(timer)}}}'